@@ -0,0 +1,111 @@
+import contextlib
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, Optional
+
+from fastapi import exceptions
+
+from app.metrics import REJECTIONS
+from app.settings.kafka import get_producer, producer_queue_capacity
+from app.settings.variables import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_IN_FLIGHT_PER_DAG,
+    ADMISSION_MAX_QUEUE_FILL,
+    ADMISSION_RETRY_AFTER_S,
+)
+from app.spool import spool_enabled
+
+
+def overloaded(
+    detail: str, reason: str, status_code: int = 503, retry_after_s: int = ADMISSION_RETRY_AFTER_S
+) -> exceptions.HTTPException:
+    """
+    Build the error returned to a request shed under load.
+    """
+    REJECTIONS.labels(reason).inc()
+    return exceptions.HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(retry_after_s)},
+    )
+
+
+class AdmissionController:
+    """
+    Reject requests beyond the capacity of the worker instead of queueing them.
+
+    A request is rejected with 503 when the worker already handles
+    `max_in_flight` requests or the producer queue is filled above
+    `max_queue_fill`, and with 429 when its DAG already has
+    `max_in_flight_per_dag` requests in flight, so a single DAG cannot take
+    all the capacity. Limits set to 0 are disabled.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_in_flight_per_dag: int = ADMISSION_MAX_IN_FLIGHT_PER_DAG,
+        max_queue_fill: float = ADMISSION_MAX_QUEUE_FILL,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_dag = max_in_flight_per_dag
+        self.max_queue_fill = max_queue_fill
+        self.queue_max_messages = producer_queue_capacity()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._in_flight_per_dag: Dict[str, int] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _check(self, dag_ids: Iterable[str]):
+        if self.max_in_flight and self._in_flight >= self.max_in_flight:
+            raise overloaded(
+                f"Too many requests in flight ({self._in_flight})", reason="in_flight"
+            )
+        # With the spool, the drainer alone fills the producer queue
+        if self.max_queue_fill and not spool_enabled():
+            queued = len(get_producer())
+            if queued >= self.max_queue_fill * self.queue_max_messages:
+                raise overloaded(
+                    f"Kafka producer queue is saturated ({queued} messages)", reason="queue"
+                )
+        if self.max_in_flight_per_dag:
+            for dag_id in dag_ids:
+                if self._in_flight_per_dag.get(dag_id, 0) >= self.max_in_flight_per_dag:
+                    raise overloaded(
+                        f"Too many requests in flight for DAG {dag_id}",
+                        reason="dag",
+                        status_code=429,
+                    )
+
+    @contextlib.contextmanager
+    def admit(self, dag_ids: Iterable[Optional[str]] = ()) -> Iterator[None]:
+        """
+        Count a request in flight for its DAGs, or raise if it must be shed.
+        """
+        dag_ids = {dag_id for dag_id in dag_ids if dag_id is not None}
+        with self._lock:
+            try:
+                self._check(dag_ids)
+            except exceptions.HTTPException as e:
+                logging.getLogger("admission").debug(f"Request rejected: {e.detail}")
+                raise
+            self._in_flight += 1
+            for dag_id in dag_ids:
+                self._in_flight_per_dag[dag_id] = self._in_flight_per_dag.get(dag_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                for dag_id in dag_ids:
+                    remaining = self._in_flight_per_dag[dag_id] - 1
+                    if remaining:
+                        self._in_flight_per_dag[dag_id] = remaining
+                    else:
+                        del self._in_flight_per_dag[dag_id]
+
+
+admission_controller = AdmissionController()
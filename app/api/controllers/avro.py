@@ -0,0 +1,226 @@
+import io
+import json
+import logging
+import struct
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from app.api.controllers.pipelines import EVENT_PIPELINES, get_pipeline_for_topic
+from app.settings.variables import (
+    AVRO_ENCODER,
+    SCHEMA_REGISTRY_URL,
+)
+
+# The Schema Registry client and fastavro are only imported in Avro mode
+if TYPE_CHECKING:
+    from confluent_kafka.schema_registry import SchemaRegistryClient
+    from confluent_kafka.schema_registry.avro import AvroSerializer
+
+# Confluent wire format: magic byte followed by the 4-byte schema id
+CONFLUENT_MAGIC_BYTE = 0
+CONFLUENT_HEADER = struct.Struct(">bI")
+
+AVRO_TOPIC_VERSIONS = tuple(
+    (pipeline.topic, pipeline.version) for pipeline in EVENT_PIPELINES.values()
+)
+
+
+def get_avro_schema(topic: str, version: str) -> Tuple[str, str]:
+    """
+    Return the (key, value) Avro schemas of a topic as JSON strings.
+
+    Schemas are built once per event pipeline; later calls are a dictionary
+    lookup.
+    """
+    return get_pipeline_for_topic(topic, version).avro_schemas
+
+
+_schema_registry_client: Optional["SchemaRegistryClient"] = None
+_schema_registry_client_lock = threading.Lock()
+
+
+def get_schema_registry_client() -> "SchemaRegistryClient":
+    """
+    Return the Schema Registry client shared by all the serializers.
+    """
+    global _schema_registry_client
+    if _schema_registry_client is None:
+        with _schema_registry_client_lock:
+            if _schema_registry_client is None:
+                from confluent_kafka.schema_registry import SchemaRegistryClient
+
+                _schema_registry_client = SchemaRegistryClient({"url": SCHEMA_REGISTRY_URL})
+    return _schema_registry_client
+
+
+def set_schema_registry_client(client: "SchemaRegistryClient"):
+    """
+    Replace the Schema Registry client, e.g. with a mock in benchmarks.
+
+    The serializers and encoders built with the previous client are dropped,
+    since their schema ids come from it.
+    """
+    global _schema_registry_client
+    with _schema_registry_client_lock:
+        _schema_registry_client = client
+    invalidate_avro_serializers()
+
+
+_avro_serializers: Dict[Tuple[str, str], Tuple["AvroSerializer", "AvroSerializer"]] = {}
+_avro_serializers_lock = threading.Lock()
+
+
+def get_avro_serializers(topic: str, version: str) -> Tuple["AvroSerializer", "AvroSerializer"]:
+    """
+    Return the (key, value) Avro serializers for a topic and Airflow version.
+
+    Serializers are built on first use and reused afterwards, so the schema
+    generation and the Schema Registry lookup happen once per (topic, version).
+    """
+    serializers = _avro_serializers.get((topic, version))
+    if serializers is not None:
+        return serializers
+    with _avro_serializers_lock:
+        serializers = _avro_serializers.get((topic, version))
+        if serializers is None:
+            from confluent_kafka.schema_registry.avro import AvroSerializer
+
+            logger = logging.getLogger("get_avro_serializers")
+            schema_key, schema_value = get_avro_schema(topic, version)
+            client = get_schema_registry_client()
+            serializers = (
+                AvroSerializer(client, schema_key),
+                AvroSerializer(client, schema_value),
+            )
+            _avro_serializers[(topic, version)] = serializers
+            logger.info(f"Avro serializers built for topic {topic} ({version})")
+    return serializers
+
+
+class AvroEncoder:
+    """
+    Encode records in the Confluent wire format with fastavro.
+
+    The schema is parsed once and the schema id is resolved once, so each
+    call only runs `schemaless_writer` into a per-thread reusable buffer.
+    """
+
+    def __init__(self, parsed_schema: dict, schema_id: int):
+        import fastavro
+
+        self.schema_id = schema_id
+        self.parsed_schema = parsed_schema
+        self._schemaless_writer = fastavro.schemaless_writer
+        self.header = CONFLUENT_HEADER.pack(CONFLUENT_MAGIC_BYTE, schema_id)
+        self._local = threading.local()
+
+    def _buffer(self) -> io.BytesIO:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = io.BytesIO()
+        buffer.seek(0)
+        buffer.truncate()
+        return buffer
+
+    def encode(self, record: Dict[str, Any]) -> bytes:
+        buffer = self._buffer()
+        buffer.write(self.header)
+        self._schemaless_writer(buffer, self.parsed_schema, record)
+        return buffer.getvalue()
+
+    def encode_many(self, records: Iterable[Dict[str, Any]]) -> List[bytes]:
+        buffer = self._buffer()
+        encoded = []
+        for record in records:
+            buffer.write(self.header)
+            self._schemaless_writer(buffer, self.parsed_schema, record)
+            encoded.append(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+        return encoded
+
+
+def build_avro_encoder(
+    subject: str, schema_str: str, parsed_schema: Optional[dict] = None
+) -> AvroEncoder:
+    """
+    Register the schema under `subject`, like AvroSerializer does, and build
+    an encoder for the registered id.
+
+    `parsed_schema` is the schema already parsed by fastavro, if any;
+    otherwise `schema_str` is parsed.
+    """
+    from confluent_kafka.schema_registry import Schema
+
+    schema_id = get_schema_registry_client().register_schema(
+        subject, Schema(schema_str, schema_type="AVRO")
+    )
+    if parsed_schema is None:
+        import fastavro
+
+        parsed_schema = fastavro.parse_schema(json.loads(schema_str))
+    return AvroEncoder(parsed_schema, schema_id)
+
+
+_avro_encoders: Dict[Tuple[str, str], Tuple[AvroEncoder, AvroEncoder]] = {}
+_avro_encoders_lock = threading.Lock()
+
+
+def get_avro_encoders(topic: str, version: str) -> Tuple[AvroEncoder, AvroEncoder]:
+    """
+    Return the (key, value) fastavro encoders for a topic and Airflow version.
+
+    Subjects follow the topic name strategy used by AvroSerializer. The
+    value encoder reuses the schema parsed once by the event model.
+    """
+    encoders = _avro_encoders.get((topic, version))
+    if encoders is not None:
+        return encoders
+    with _avro_encoders_lock:
+        encoders = _avro_encoders.get((topic, version))
+        if encoders is None:
+            logger = logging.getLogger("get_avro_encoders")
+            schema_key, schema_value = get_avro_schema(topic, version)
+            model = get_pipeline_for_topic(topic, version).model
+            encoders = (
+                build_avro_encoder(f"{topic}-key", schema_key),
+                build_avro_encoder(
+                    f"{topic}-value", schema_value, model.parsed_avro_schema()
+                ),
+            )
+            _avro_encoders[(topic, version)] = encoders
+            logger.info(
+                f"Avro encoders built for topic {topic} ({version}) with schema ids "
+                f"{encoders[0].schema_id} (key) and {encoders[1].schema_id} (value)"
+            )
+    return encoders
+
+
+def warm_avro_serializers():
+    """
+    Build the Avro serializers of every known topic ahead of the first request.
+    """
+    for topic, version in AVRO_TOPIC_VERSIONS:
+        if AVRO_ENCODER == "fastavro":
+            get_avro_encoders(topic, version)
+        else:
+            get_avro_serializers(topic, version)
+
+
+def invalidate_avro_serializers(
+    topic: Optional[str] = None, version: Optional[str] = None
+):
+    """
+    Drop cached Avro serializers and encoders so they are rebuilt on next use.
+
+    Without arguments every entry is dropped; otherwise only the entries
+    matching `topic`/`version`.
+    """
+    with _avro_serializers_lock, _avro_encoders_lock:
+        for cache in (_avro_serializers, _avro_encoders):
+            for cached_topic, cached_version in list(cache):
+                if topic is not None and cached_topic != topic:
+                    continue
+                if version is not None and cached_version != version:
+                    continue
+                del cache[(cached_topic, cached_version)]
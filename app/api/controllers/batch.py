@@ -0,0 +1,237 @@
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Type
+from fastapi import Request, exceptions
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from app.api.controllers.common import publish_messages
+from app.api.controllers.dedup import dedup_cache, event_identity
+from app.api.controllers.encoding import (
+    is_msgpack,
+    is_ndjson,
+    iter_body,
+    iter_lines,
+    iter_msgpack_items,
+    read_body,
+)
+from app.settings.variables import (
+    API_STREAM_CHUNK_SIZE,
+    API_STREAM_MAX_ERRORS,
+    API_STREAM_MAX_LINE_BYTES,
+)
+
+
+async def read_batch_items(request: Request, raw_lines: bool = False) -> List[Any]:
+    """
+    Read the items of a batch request, sent as a JSON list, NDJSON or
+    MessagePack, optionally compressed with gzip or zstd.
+
+    NDJSON lines that are not valid JSON are kept as `json.JSONDecodeError`
+    instances so they are reported per item instead of failing the batch.
+    With `raw_lines`, NDJSON lines are returned as bytes, to be validated
+    straight from JSON.
+    """
+    if is_msgpack(request):
+        return [item async for item in iter_msgpack_items(iter_body(request))]
+    if is_ndjson(request):
+        lines = iter_lines(iter_body(request), max_line_bytes=API_STREAM_MAX_LINE_BYTES)
+        if raw_lines:
+            return [line async for line in lines]
+        items = []
+        async for line in lines:
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(e)
+        return items
+    body = await read_body(request)
+    try:
+        items = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise exceptions.HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(items, list):
+        raise exceptions.HTTPException(
+            status_code=422, detail="Expected a JSON list of events"
+        )
+    return items
+
+
+def validation_errors(error: ValidationError) -> List[Dict[str, Any]]:
+    return [
+        {"loc": list(err["loc"]), "msg": err["msg"], "type": err["type"]}
+        for err in error.errors()
+    ]
+
+
+def iter_stream_items(request: Request) -> AsyncIterator[Any]:
+    """
+    Yield the items of a streamed request as they arrive: NDJSON lines as
+    bytes, or MessagePack items. The body size is not bounded, only the
+    size of an item, decoded in bounded pieces.
+    """
+    chunks = iter_body(request, max_bytes=None)
+    if is_msgpack(request):
+        return iter_msgpack_items(chunks, max_item_bytes=API_STREAM_MAX_LINE_BYTES)
+    return iter_lines(chunks, max_line_bytes=API_STREAM_MAX_LINE_BYTES)
+
+
+def validate_item(
+    item: Any, model: Type[BaseModel], adapter: Optional[TypeAdapter] = None
+) -> BaseModel:
+    """
+    Validate an item read as raw JSON bytes or as decoded Python objects.
+    """
+    if isinstance(item, bytes):
+        return adapter.validate_json(item) if adapter else model.model_validate_json(item)
+    return model.model_validate(item)
+
+
+async def publish_batch(
+    items: List[Any],
+    model: Type[BaseModel],
+    topic: str,
+    version: str,
+    key_fields: Sequence[str],
+    adapter: Optional[TypeAdapter] = None,
+    identity_fields: Sequence[str] = (),
+) -> Dict[str, Any]:
+    """
+    Validate every item of a batch, publish the valid ones and report per item.
+
+    All the items are validated before anything is produced, and the valid
+    ones are published together with a single flush. Items read as raw bytes
+    are validated from JSON, with `adapter` when given. Events with the same
+    `identity_fields` as one published recently are reported as duplicates.
+    """
+    logger = logging.getLogger("publish_batch")
+    results: List[Dict[str, Any]] = []
+    events = []
+    identities = []
+    published_indexes = []
+    for index, item in enumerate(items):
+        if isinstance(item, json.JSONDecodeError):
+            results.append(
+                {"index": index, "status": "invalid", "detail": f"Invalid JSON: {item}"}
+            )
+            continue
+        try:
+            event = validate_item(item, model, adapter)
+        except ValidationError as e:
+            results.append(
+                {"index": index, "status": "invalid", "errors": validation_errors(e)}
+            )
+            continue
+        identity = event_identity(event, identity_fields)
+        if not dedup_cache.reserve(topic, identity):
+            results.append({"index": index, "status": "duplicate"})
+            continue
+        events.append(event)
+        identities.append(identity)
+        published_indexes.append(index)
+        results.append({"index": index, "status": "published"})
+
+    if events:
+        try:
+            delivery_errors = await publish_messages(
+                topic=topic, version=version, events=events, key_fields=key_fields
+            )
+        except BaseException:
+            for identity in identities:
+                dedup_cache.release(topic, identity)
+            raise
+        for index, identity, error in zip(published_indexes, identities, delivery_errors):
+            if error is not None:
+                dedup_cache.release(topic, identity)
+                results[index] = {"index": index, "status": "failed", "detail": error}
+
+    summary = {"total": len(results)}
+    for status in ("published", "duplicate", "invalid", "failed"):
+        summary[status] = sum(result["status"] == status for result in results)
+    logger.info(f"Batch for topic {topic} processed: {summary}")
+    return {**summary, "items": results}
+
+
+async def publish_stream(
+    items: AsyncIterator[Any],
+    model: Type[BaseModel],
+    topic: str,
+    version: str,
+    key_fields: Sequence[str],
+    adapter: Optional[TypeAdapter] = None,
+    identity_fields: Sequence[str] = (),
+    chunk_size: int = API_STREAM_CHUNK_SIZE,
+    max_errors: int = API_STREAM_MAX_ERRORS,
+) -> Dict[str, Any]:
+    """
+    Validate and publish the items of a stream as they arrive, `chunk_size`
+    events at a time, and report counts and the first `max_errors` errors.
+
+    Only the pending chunk is kept in memory, and no item is read while a
+    chunk is published, so a slow Kafka slows the client down instead of
+    buffering the stream. When the stream stops early, for instance because
+    the worker is overloaded, the error is raised with the summary so far
+    and the index of the first event not published in `resume_from`.
+    """
+    logger = logging.getLogger("publish_stream")
+    counts = dict.fromkeys(("published", "duplicate", "invalid", "failed"), 0)
+    errors: List[Dict[str, Any]] = []
+    chunk: List[Tuple[int, BaseModel, Optional[Tuple]]] = []
+    total = 0
+
+    def report(status: str, result: Dict[str, Any]):
+        counts[status] += 1
+        if len(errors) < max_errors:
+            errors.append({"status": status, **result})
+
+    async def publish_chunk():
+        delivery_errors = await publish_messages(
+            topic=topic,
+            version=version,
+            events=[event for _, event, _ in chunk],
+            key_fields=key_fields,
+        )
+        for (index, _, identity), error in zip(chunk, delivery_errors):
+            if error is None:
+                counts["published"] += 1
+            else:
+                dedup_cache.release(topic, identity)
+                report("failed", {"index": index, "detail": error})
+        chunk.clear()
+
+    def summary() -> Dict[str, Any]:
+        return {"total": total, **counts, "errors": errors}
+
+    try:
+        async for item in items:
+            index = total
+            total += 1
+            try:
+                event = validate_item(item, model, adapter)
+            except ValidationError as e:
+                report("invalid", {"index": index, "errors": validation_errors(e)})
+                continue
+            identity = event_identity(event, identity_fields)
+            if not dedup_cache.reserve(topic, identity):
+                counts["duplicate"] += 1
+                continue
+            chunk.append((index, event, identity))
+            if len(chunk) >= chunk_size:
+                await publish_chunk()
+        if chunk:
+            await publish_chunk()
+    except BaseException as e:
+        resume_from = chunk[0][0] if chunk else total
+        for _, _, identity in chunk:
+            dedup_cache.release(topic, identity)
+        if not isinstance(e, exceptions.HTTPException):
+            raise
+        logger.warning(
+            f"Stream for topic {topic} stopped at event {resume_from}: {e.detail}"
+        )
+        raise exceptions.HTTPException(
+            status_code=e.status_code,
+            detail={"error": e.detail, "resume_from": resume_from, **summary()},
+            headers=e.headers,
+        ) from e
+    logger.info(f"Stream for topic {topic} processed: {total} events, {counts}")
+    return summary()
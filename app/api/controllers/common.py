@@ -1,159 +1,380 @@
+import asyncio
 import logging
-import json
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 from fastapi import exceptions
+from fastapi.concurrency import run_in_threadpool
+from confluent_kafka import KafkaException
+from pydantic import BaseModel
 from confluent_kafka.serialization import (
     SerializationContext,
     MessageField,
 )
-from confluent_kafka.schema_registry import SchemaRegistryClient
-from confluent_kafka.schema_registry.avro import AvroSerializer
 
+from app.api.controllers.avro import get_avro_encoders, get_avro_serializers
+from app.api.controllers.json_serializers import get_json_serializer
+from app.metrics import DELIVERIES, FLUSH_DURATION, SERIALIZATION_DURATION
 from app.settings.variables import (
-    KAFKA_AIRFLOW_V2_DAG_RUN_TOPIC_NAME,
-    KAFKA_AIRFLOW_V2_TASK_INSTANCE_TOPIC_NAME,
-    KAFKA_AIRFLOW_V3_DAG_RUN_TOPIC_NAME,
-    KAFKA_AIRFLOW_V3_TASK_INSTANCE_TOPIC_NAME,
+    AVRO_ENCODER,
+    KAFKA_DELIVERY_TIMEOUT_S,
+    KAFKA_PUBLISH_MODE,
     SCHEMA_REGISTRY_URL,
 )
-from app.settings.kafka import producer
+from app.api.controllers.admission import admission_controller, overloaded
+from app.api.controllers.dedup import dedup_cache, event_identity
+from app.settings.kafka import (
+    discard_transactional_producer,
+    get_producer,
+    producer_queue_capacity,
+    start_delivery_poller,
+    transactional_producer,
+    transactions_enabled,
+)
+from app.spool import SpoolFullError, spool_enabled, spool_records
 
 
 def delivery_report(err, msg):
     logger = logging.getLogger("publish_message_to_kafka")
     if err is not None:
+        DELIVERIES.labels(msg.topic(), "failure").inc()
         logger.error(f"Message delivery failed: {err}")
     else:
+        DELIVERIES.labels(msg.topic(), "success").inc()
         logger.info(f"Message delivered to {msg.topic()} [{msg.partition()}]")
 
 
-def get_avro_schema(topic: str, version: str) -> Tuple[str, str]:
-    schema_value = None
-    if topic in [KAFKA_AIRFLOW_V2_DAG_RUN_TOPIC_NAME, KAFKA_AIRFLOW_V3_DAG_RUN_TOPIC_NAME]:
-        if version == "v3":
-            from app.models.airflow_v3.dag_run import DagRun
+def serialize_message_json(
+    event: BaseModel,
+    key_fields: Sequence[str] = (),
+) -> Tuple[bytes, Optional[bytes]]:
+    """
+    Serialize an event and its key to JSON with the configured serializer.
+    """
+    json_serializer = get_json_serializer()
+    with SERIALIZATION_DURATION.labels("json").time():
+        return (
+            json_serializer.value(event),
+            json_serializer.key(event, key_fields) if key_fields else None,
+        )
 
-            schema_value = DagRun.avro_schema()
-        elif version == "v2":
-            from app.models.airflow_v2.dag_run import DagRun
 
-            schema_value = DagRun.avro_schema()
-        else:
-            raise ValueError(f"Unknown version: {version}")
-        schema_key = {
-            "type": "record",
-            "name": "key",
-            "fields": [
-                field for field in schema_value["fields"] if field["name"] == "dag_id"
-            ],
-        }
-        return json.dumps(schema_key), json.dumps(schema_value)
-    elif topic in [KAFKA_AIRFLOW_V2_TASK_INSTANCE_TOPIC_NAME, KAFKA_AIRFLOW_V3_TASK_INSTANCE_TOPIC_NAME]:
-        if version == "v3":
-            from app.models.airflow_v3.task_instance import TaskInstance
-
-            schema_value = TaskInstance.avro_schema()
-        elif version == "v2":
-            from app.models.airflow_v2.task_instance import TaskInstance
-
-            schema_value = TaskInstance.avro_schema()
+def serialize_message_avro(
+    topic: str,
+    version: str,
+    event: BaseModel,
+    key_fields: Sequence[str] = (),
+) -> Tuple[bytes, Optional[bytes]]:
+    """
+    Serialize a message and its key to Avro in the Confluent wire format.
+
+    Uses the cached fastavro encoders, or the Confluent AvroSerializer when
+    `AVRO_ENCODER` is `confluent`.
+    """
+    logger = logging.getLogger("serialize_message_avro")
+    try:
+        if AVRO_ENCODER == "fastavro":
+            avro_encoder_key, avro_encoder_value = get_avro_encoders(topic, version)
         else:
-            raise ValueError(f"Unknown version: {version}")
-        schema_key = {
-            "type": "record",
-            "name": "key",
-            "fields": [
-                field
-                for field in schema_value["fields"]
-                if field["name"] in ["dag_id", "task_id"]
-            ],
-        }
-        return json.dumps(schema_key), json.dumps(schema_value)
-    else:
-        raise ValueError(f"Unknown topic: {topic}")
+            avro_serializer_key, avro_serializer_value = get_avro_serializers(
+                topic, version
+            )
+    except ValueError as e:
+        logger.error(f"Schema not found for topic {topic}: {e}")
+        raise exceptions.HTTPException(
+            status_code=500, detail="Schema not found for topic"
+        )
+    with SERIALIZATION_DURATION.labels("avro").time():
+        message = event.model_dump()
+        key = {field: message[field] for field in key_fields} if key_fields else None
+        if AVRO_ENCODER == "fastavro":
+            return (
+                avro_encoder_value.encode(message),
+                avro_encoder_key.encode(key) if key is not None else None,
+            )
+        return (
+            avro_serializer_value(
+                message, SerializationContext(topic, MessageField.VALUE)
+            ),
+            (
+                avro_serializer_key(key, SerializationContext(topic, MessageField.KEY))
+                if key is not None
+                else None
+            ),
+        )
+
+
+def serialize_message(
+    topic: str,
+    version: str,
+    event: BaseModel,
+    key_fields: Sequence[str] = (),
+) -> Tuple[bytes, Optional[bytes]]:
+    """
+    Serialize an event and its key with the configured format.
+    """
+    if SCHEMA_REGISTRY_URL is not None:
+        return serialize_message_avro(topic, version, event, key_fields)
+    return serialize_message_json(event, key_fields)
+
+
+def serialize_messages_avro(
+    topic: str,
+    version: str,
+    events: List[BaseModel],
+    key_fields: Sequence[str] = (),
+) -> List[Tuple[bytes, Optional[bytes]]]:
+    """
+    Serialize a batch of events and their keys to Avro in one pass with the
+    fastavro encoders. Raises ValueError when any event cannot be encoded.
+    """
+    avro_encoder_key, avro_encoder_value = get_avro_encoders(topic, version)
+    start = time.perf_counter()
+    records = [event.model_dump() for event in events]
+    values = avro_encoder_value.encode_many(records)
+    keys = (
+        avro_encoder_key.encode_many(
+            {field: record[field] for field in key_fields} for record in records
+        )
+        if key_fields
+        else [None] * len(values)
+    )
+    # The histogram is per message, so each one gets the average time
+    elapsed = (time.perf_counter() - start) / max(len(events), 1)
+    histogram = SERIALIZATION_DURATION.labels("avro")
+    for _ in events:
+        histogram.observe(elapsed)
+    return list(zip(values, keys))
+
+
+def serialize_messages(
+    topic: str,
+    version: str,
+    events: List[BaseModel],
+    key_fields: Sequence[str] = (),
+) -> Tuple[List[Tuple[int, bytes, Optional[bytes]]], Dict[int, str]]:
+    """
+    Serialize a batch of events and their keys with the configured format.
+
+    Returns the (index, value, key) of every serialized event, and the
+    reason each other event could not be serialized, by index. With the
+    fastavro encoder the batch is encoded in one pass, and the events are
+    only serialized one at a time to find the ones that fail.
+    """
+    logger = logging.getLogger("serialize_messages")
+    if SCHEMA_REGISTRY_URL is not None and AVRO_ENCODER == "fastavro" and events:
+        try:
+            serialized = serialize_messages_avro(topic, version, events, key_fields)
+            return [(index, *message) for index, message in enumerate(serialized)], {}
+        except ValueError:
+            pass
+    messages = []
+    errors = {}
+    for index, event in enumerate(events):
+        try:
+            messages.append((index, *serialize_message(topic, version, event, key_fields)))
+        except (exceptions.HTTPException, ValueError) as e:
+            logger.error(f"Failed to serialize message {index}: {e}")
+            errors[index] = str(getattr(e, "detail", e))
+    return messages, errors
+
+
+class DeliveryWaiter:
+    """
+    Wait for the delivery reports of the messages produced by one request.
+
+    `producer.flush()` waits for the whole queue shared by every request,
+    so under load a request could time out although its own messages were
+    delivered. The waiter only counts the messages produced with its
+    callbacks, served by the delivery poller.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._done = threading.Event()
+        self._done.set()
+
+    def callback(self, on_delivery: Callable = delivery_report) -> Callable:
+        """
+        Return a delivery callback for one more message to wait for.
+        """
+        with self._lock:
+            self._pending += 1
+            self._done.clear()
+
+        def callback(err, msg):
+            try:
+                on_delivery(err, msg)
+            finally:
+                self.cancel()
+
+        return callback
+
+    def cancel(self):
+        """
+        Stop waiting for a message, e.g. because it could not be queued.
+        """
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._done.set()
+
+    def wait(self, timeout: float = KAFKA_DELIVERY_TIMEOUT_S) -> bool:
+        """
+        Wait for every delivery report, returning False on timeout.
+        """
+        start_delivery_poller()
+        with FLUSH_DURATION.time():
+            return self._done.wait(timeout)
+
+
+def produce_message(topic: str, value, key, headers: dict, callback):
+    """
+    Queue a message in the producer, shedding the request when it is full.
+    """
+    try:
+        get_producer().produce(
+            topic=topic, value=value, key=key, headers=headers, callback=callback
+        )
+    except BufferError:
+        raise overloaded("Kafka producer queue is full", reason="buffer")
+
+
+# Delay between attempts to queue a batch message while the queue is full
+QUEUE_FULL_RETRY_S = 0.01
+
+
+def check_queue_room(count: int):
+    """
+    Shed a batch with 503 before any of its messages is produced when the
+    producer queue cannot take all of them.
+    """
+    queued = len(get_producer())
+    if queued + count > producer_queue_capacity():
+        raise overloaded(
+            f"Kafka producer queue has no room for {count} messages ({queued} queued)",
+            reason="buffer",
+        )
+
+
+def produce_batch_message(
+    topic: str, value, key, headers: dict, callback, first: bool, deadline: float
+):
+    """
+    Queue a message of a batch in the producer.
+
+    The queue can still fill up under concurrent requests once the batch
+    was admitted. When nothing of the batch is queued yet, it is shed with
+    503. Otherwise the earlier messages would be produced again by the
+    retry, so this waits for the delivery poller to make room until
+    `deadline`, then raises BufferError.
+    """
+    while True:
+        try:
+            get_producer().produce(
+                topic=topic, value=value, key=key, headers=headers, callback=callback
+            )
+            return
+        except BufferError:
+            if first:
+                raise overloaded("Kafka producer queue is full", reason="buffer")
+            if time.monotonic() >= deadline:
+                raise
+        time.sleep(QUEUE_FULL_RETRY_S)
+
+
+async def produce_batch_message_async(
+    topic: str, value, key, headers: dict, callback, first: bool, deadline: float
+):
+    """
+    Like `produce_batch_message`, without blocking the event loop.
+    """
+    while True:
+        try:
+            get_producer().produce(
+                topic=topic, value=value, key=key, headers=headers, callback=callback
+            )
+            return
+        except BufferError:
+            if first:
+                raise overloaded("Kafka producer queue is full", reason="buffer")
+            if time.monotonic() >= deadline:
+                raise
+        await asyncio.sleep(QUEUE_FULL_RETRY_S)
+
+
+def deliver_message(topic: str, value, key, headers: dict):
+    """
+    Produce a message and wait for its own delivery report.
+    """
+    errors = []
+
+    def on_delivery(err, msg):
+        delivery_report(err, msg)
+        if err is not None:
+            errors.append(err)
+
+    waiter = DeliveryWaiter()
+    callback = waiter.callback(on_delivery)
+    try:
+        produce_message(topic, value, key, headers, callback=callback)
+    except BaseException:
+        waiter.cancel()
+        raise
+    if not waiter.wait():
+        logging.getLogger("deliver_message").error(
+            f"Timed out waiting for the delivery of a message to topic {topic}"
+        )
+        raise exceptions.HTTPException(
+            status_code=500, detail="Failed to deliver message to Kafka"
+        )
+    if errors:
+        raise exceptions.HTTPException(
+            status_code=500, detail=f"Failed to deliver message to Kafka: {errors[0]}"
+        )
 
 
 def publish_message_to_kafka_json(
     topic: str,
-    message: dict,
-    key: Optional[dict] = None,
+    event: BaseModel,
+    key_fields: Sequence[str] = (),
     headers: dict = None,
 ):
     """
     Publish a message to Kafka in JSON format.
     """
-    import json
-
     logger = logging.getLogger("publish_message_to_kafka_json")
     if headers is None:
         headers = {}
-    producer.produce(
-        topic=topic,
-        value=json.dumps(message, default=str),
-        key=json.dumps(key, default=str) if key else None,
-        headers=headers,
-        callback=delivery_report,
-    )
-    if producer.flush(timeout=10) > 0:
-        logger.error("Failed to flush messages to Kafka")
-        raise exceptions.HTTPException(
-            status_code=500, detail="Failed to flush messages to Kafka"
-        )
+    value, key_value = serialize_message_json(event, key_fields)
+    deliver_message(topic, value, key_value, headers)
     logger.info(
-        f"Message published to topic {topic} with key {key} and headers {headers}"
+        f"Message published to topic {topic} with key {key_value} and headers {headers}"
     )
 
 
 def publish_message_to_kafka_avro(
     topic: str,
     version: str,
-    message: dict,
-    key: Optional[dict] = None,
+    event: BaseModel,
+    key_fields: Sequence[str] = (),
     headers: Optional[dict] = None,
 ):
     """
     Publish a message to Kafka in Avro format.
     """
-    logger = logging.getLogger("publish_message_to_kafka_avro")
     if headers is None:
         headers = {}
-    schema_registry_conf = {
-        "url": SCHEMA_REGISTRY_URL,
-    }
-    schema_key, schema_value = get_avro_schema(topic, version)
-    if not schema_key or not schema_value:
-        logger.error(f"Schema not found for topic {topic}")
-        raise exceptions.HTTPException(
-            status_code=500, detail="Schema not found for topic"
-        )
-    schema_registry_client = SchemaRegistryClient(schema_registry_conf)
-    avro_serializer_key = AvroSerializer(schema_registry_client, schema_key)
-    avro_serializer_value = AvroSerializer(schema_registry_client, schema_value)
-    producer.produce(
-        topic=topic,
-        value=avro_serializer_value(
-            message, SerializationContext(topic, MessageField.VALUE)
-        ),
-        key=(
-            avro_serializer_key(key, SerializationContext(topic, MessageField.KEY))
-            if key is not None
-            else None
-        ),
-        headers=headers,
-        callback=lambda err, msg: delivery_report(err, msg),
-    )
-    if producer.flush(timeout=10) > 0:
-        logger.error("Failed to flush messages to Kafka")
-        raise exceptions.HTTPException(
-            status_code=500, detail="Failed to flush messages to Kafka"
-        )
+    value, key_value = serialize_message_avro(topic, version, event, key_fields)
+    deliver_message(topic, value, key_value, headers)
 
 
 def publish_message_to_kafka(
     topic: str,
     version: str,
-    message: dict,
-    key: Optional[dict] = None,
+    event: BaseModel,
+    key_fields: Sequence[str] = (),
     headers: Optional[dict] = None,
 ):
     """
@@ -161,12 +382,399 @@ def publish_message_to_kafka(
     """
     if SCHEMA_REGISTRY_URL is not None:
         publish_message_to_kafka_avro(
-            topic=topic, message=message, key=key, headers=headers, version=version
+            topic=topic,
+            event=event,
+            key_fields=key_fields,
+            headers=headers,
+            version=version,
         )
     else:
         publish_message_to_kafka_json(
             topic=topic,
-            message=message,
-            key=key,
+            event=event,
+            key_fields=key_fields,
+            headers=headers,
+        )
+
+
+def _resolve_delivery(future: asyncio.Future, err, msg):
+    if future.done():
+        return
+    if err is not None:
+        future.set_exception(KafkaException(err))
+    else:
+        future.set_result(msg)
+
+
+def delivery_future(loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+    """
+    Build a delivery callback that resolves `future` on the event loop.
+
+    The callback runs on the delivery poller thread, so the result is handed
+    back to the loop with `call_soon_threadsafe`.
+    """
+
+    def callback(err, msg):
+        delivery_report(err, msg)
+        loop.call_soon_threadsafe(_resolve_delivery, future, err, msg)
+
+    return callback
+
+
+async def publish_message_to_kafka_async(
+    topic: str,
+    version: str,
+    event: BaseModel,
+    key_fields: Sequence[str] = (),
+    headers: Optional[dict] = None,
+):
+    """
+    Publish a message to Kafka without flushing the producer.
+
+    The message is queued with `produce()` and the delivery result is awaited
+    through a future resolved by the background delivery poller.
+    """
+    logger = logging.getLogger("publish_message_to_kafka_async")
+    if headers is None:
+        headers = {}
+    start_delivery_poller()
+    value, key_value = serialize_message(topic, version, event, key_fields)
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    produce_message(topic, value, key_value, headers, callback=delivery_future(loop, future))
+    try:
+        await asyncio.wait_for(future, timeout=KAFKA_DELIVERY_TIMEOUT_S)
+    except (KafkaException, asyncio.TimeoutError) as e:
+        logger.error(f"Failed to deliver message to Kafka: {e}")
+        raise exceptions.HTTPException(
+            status_code=500, detail="Failed to deliver message to Kafka"
+        )
+
+
+def spool_messages(
+    topic: str,
+    version: str,
+    events: List[BaseModel],
+    key_fields: Sequence[str] = (),
+    headers: Optional[dict] = None,
+) -> List[Optional[str]]:
+    """
+    Serialize events and write them durably to the local spool.
+
+    The spool drainer publishes them to Kafka afterwards. Returns one entry
+    per event: None when it was spooled, otherwise the reason it was not.
+    """
+    logger = logging.getLogger("spool_messages")
+    if headers is None:
+        headers = {}
+    results: List[Optional[str]] = [None] * len(events)
+    records = []
+    spooled_indexes = []
+    messages, errors = serialize_messages(topic, version, events, key_fields)
+    for index, error in errors.items():
+        results[index] = error
+    for index, value, key_value in messages:
+        records.append((topic, key_value, value, headers))
+        spooled_indexes.append(index)
+    if records:
+        try:
+            spool_records(records)
+        except SpoolFullError as e:
+            logger.error(f"Failed to spool messages: {e}")
+            for index in spooled_indexes:
+                results[index] = str(e)
+    return results
+
+
+async def publish_message(
+    topic: str,
+    version: str,
+    event: BaseModel,
+    key_fields: Sequence[str] = (),
+    headers: Optional[dict] = None,
+    identity_fields: Sequence[str] = (),
+) -> bool:
+    """
+    Publish a message to Kafka from an async route handler.
+
+    With the spool enabled the message is only written durably to the
+    spool. In `async` publish mode the delivery is awaited on the event loop;
+    otherwise the blocking publish runs in the thread pool so the event loop
+    is never blocked by `flush()`.
+
+    When `identity_fields` are given, an event with the same identity as one
+    published recently is dropped; returns False in that case.
+    """
+    identity = event_identity(event, identity_fields)
+    if not dedup_cache.reserve(topic, identity):
+        logging.getLogger("publish_message").info(
+            f"Duplicate event dropped for topic {topic}: {identity}"
+        )
+        return False
+    try:
+        await _publish_message(topic, version, event, key_fields, headers)
+    except BaseException:
+        dedup_cache.release(topic, identity)
+        raise
+    return True
+
+
+async def _publish_message(
+    topic: str,
+    version: str,
+    event: BaseModel,
+    key_fields: Sequence[str],
+    headers: Optional[dict],
+):
+    with admission_controller.admit([getattr(event, "dag_id", None)]):
+        if spool_enabled():
+            (error,) = await run_in_threadpool(
+                spool_messages,
+                topic=topic,
+                version=version,
+                events=[event],
+                key_fields=key_fields,
+                headers=headers,
+            )
+            if error is not None:
+                raise exceptions.HTTPException(status_code=503, detail=error)
+        elif KAFKA_PUBLISH_MODE == "async":
+            await publish_message_to_kafka_async(
+                topic=topic,
+                version=version,
+                event=event,
+                key_fields=key_fields,
+                headers=headers,
+            )
+        else:
+            await run_in_threadpool(
+                publish_message_to_kafka,
+                topic=topic,
+                version=version,
+                event=event,
+                key_fields=key_fields,
+                headers=headers,
+            )
+
+
+def publish_messages_to_kafka_batch(
+    topic: str,
+    version: str,
+    events: List[BaseModel],
+    key_fields: Sequence[str] = (),
+    headers: Optional[dict] = None,
+) -> List[Optional[str]]:
+    """
+    Publish a batch of events to Kafka and wait for their delivery reports.
+
+    Returns one entry per event: None when it was delivered, otherwise the
+    reason it was not. The whole batch is shed with 503 when the producer
+    queue has no room for it, so that the client retries it later.
+    """
+    logger = logging.getLogger("publish_messages_to_kafka_batch")
+    if headers is None:
+        headers = {}
+    results: List[Optional[str]] = [None] * len(events)
+    pending = set()
+    waiter = DeliveryWaiter()
+
+    def batch_callback(index: int):
+        def callback(err, msg):
+            delivery_report(err, msg)
+            pending.discard(index)
+            if err is not None:
+                results[index] = str(err)
+
+        return callback
+
+    messages, errors = serialize_messages(topic, version, events, key_fields)
+    for index, error in errors.items():
+        results[index] = error
+    check_queue_room(len(messages))
+    start_delivery_poller()
+    deadline = time.monotonic() + KAFKA_DELIVERY_TIMEOUT_S
+    queued = 0
+    for index, value, key_value in messages:
+        pending.add(index)
+        callback = waiter.callback(batch_callback(index))
+        try:
+            produce_batch_message(
+                topic, value, key_value, headers, callback, queued == 0, deadline
+            )
+            queued += 1
+        except BaseException as e:
+            waiter.cancel()
+            pending.discard(index)
+            if not isinstance(e, (KafkaException, BufferError)):
+                raise
+            logger.error(f"Failed to produce message {index} to Kafka: {e}")
+            results[index] = str(e) or "Kafka producer queue is full"
+    if not waiter.wait():
+        logger.error("Timed out waiting for the delivery of a batch to Kafka")
+    for index in list(pending):
+        results[index] = "Failed to deliver message to Kafka"
+    logger.info(
+        f"Batch of {len(events)} messages published to topic {topic}, "
+        f"{sum(result is not None for result in results)} failed"
+    )
+    return results
+
+
+def publish_messages_to_kafka_transaction(
+    topic: str,
+    version: str,
+    events: List[BaseModel],
+    key_fields: Sequence[str] = (),
+    headers: Optional[dict] = None,
+) -> List[Optional[str]]:
+    """
+    Publish a batch of events to Kafka in a single transaction.
+
+    Either every event is committed or none is: read_committed consumers
+    never see part of a batch, and a retried batch that failed is not
+    duplicated. Events that cannot be serialized are left out of the
+    transaction and reported. When the producer queue is full, the
+    transaction is aborted and the batch is shed with 503.
+    """
+    logger = logging.getLogger("publish_messages_to_kafka_transaction")
+    if headers is None:
+        headers = {}
+    results: List[Optional[str]] = [None] * len(events)
+    messages, errors = serialize_messages(topic, version, events, key_fields)
+    for index, error in errors.items():
+        results[index] = error
+    if not messages:
+        return results
+
+    with transactional_producer() as producer:
+        try:
+            producer.begin_transaction()
+            for _, value, key_value in messages:
+                producer.produce(
+                    topic=topic,
+                    value=value,
+                    key=key_value,
+                    headers=headers,
+                    callback=delivery_report,
+                )
+            with FLUSH_DURATION.time():
+                producer.commit_transaction(KAFKA_DELIVERY_TIMEOUT_S)
+        except (KafkaException, BufferError) as e:
+            error = e.args[0] if isinstance(e, KafkaException) else None
+            logger.error(f"Transaction of {len(messages)} messages to topic {topic} failed: {e}")
+            if error is not None and error.fatal():
+                discard_transactional_producer()
+            else:
+                try:
+                    producer.abort_transaction(KAFKA_DELIVERY_TIMEOUT_S)
+                except KafkaException as abort_error:
+                    logger.error(f"Failed to abort the transaction: {abort_error}")
+                    discard_transactional_producer()
+            if isinstance(e, BufferError):
+                raise overloaded("Kafka producer queue is full", reason="buffer")
+            for index, _, _ in messages:
+                results[index] = f"Transaction failed: {e}"
+            return results
+    logger.info(f"Transaction of {len(messages)} messages committed to topic {topic}")
+    return results
+
+
+async def publish_messages_to_kafka_batch_async(
+    topic: str,
+    version: str,
+    events: List[BaseModel],
+    key_fields: Sequence[str] = (),
+    headers: Optional[dict] = None,
+) -> List[Optional[str]]:
+    """
+    Publish a batch of events to Kafka without flushing.
+
+    Every event is queued before any delivery is awaited, so the whole
+    batch shares the librdkafka batches. The whole batch is shed with 503
+    when the producer queue has no room for it.
+    """
+    logger = logging.getLogger("publish_messages_to_kafka_batch_async")
+    if headers is None:
+        headers = {}
+    start_delivery_poller()
+    loop = asyncio.get_running_loop()
+    results: List[Optional[str]] = [None] * len(events)
+    futures = {}
+    messages, errors = serialize_messages(topic, version, events, key_fields)
+    for index, error in errors.items():
+        results[index] = error
+    check_queue_room(len(messages))
+    deadline = time.monotonic() + KAFKA_DELIVERY_TIMEOUT_S
+    for index, value, key_value in messages:
+        future = loop.create_future()
+        try:
+            await produce_batch_message_async(
+                topic,
+                value,
+                key_value,
+                headers,
+                delivery_future(loop, future),
+                not futures,
+                deadline,
+            )
+            futures[index] = future
+        except (KafkaException, BufferError) as e:
+            logger.error(f"Failed to produce message {index} to Kafka: {e}")
+            results[index] = str(e) or "Kafka producer queue is full"
+    if futures:
+        done, not_done = await asyncio.wait(
+            futures.values(), timeout=KAFKA_DELIVERY_TIMEOUT_S
+        )
+        for index, future in futures.items():
+            if future in not_done:
+                results[index] = "Failed to deliver message to Kafka"
+            elif future.exception() is not None:
+                results[index] = str(future.exception())
+    return results
+
+
+async def publish_messages(
+    topic: str,
+    version: str,
+    events: List[BaseModel],
+    key_fields: Sequence[str] = (),
+    headers: Optional[dict] = None,
+) -> List[Optional[str]]:
+    """
+    Publish a batch of events to Kafka from an async route handler.
+    """
+    with admission_controller.admit(getattr(event, "dag_id", None) for event in events):
+        if spool_enabled():
+            return await run_in_threadpool(
+                spool_messages,
+                topic=topic,
+                version=version,
+                events=events,
+                key_fields=key_fields,
+                headers=headers,
+            )
+        if transactions_enabled():
+            return await run_in_threadpool(
+                publish_messages_to_kafka_transaction,
+                topic=topic,
+                version=version,
+                events=events,
+                key_fields=key_fields,
+                headers=headers,
+            )
+        if KAFKA_PUBLISH_MODE == "async":
+            return await publish_messages_to_kafka_batch_async(
+                topic=topic,
+                version=version,
+                events=events,
+                key_fields=key_fields,
+                headers=headers,
+            )
+        return await run_in_threadpool(
+            publish_messages_to_kafka_batch,
+            topic=topic,
+            version=version,
+            events=events,
+            key_fields=key_fields,
             headers=headers,
         )
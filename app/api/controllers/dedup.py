@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from app.metrics import DEDUP_LOOKUPS
+from app.settings.variables import DEDUP_CACHE_SIZE, DEDUP_TTL_S
+
+
+def event_identity(event: BaseModel, fields: Sequence[str]) -> Optional[Tuple]:
+    """
+    The natural identity of an event, or None when deduplication is off for it.
+    """
+    if not fields:
+        return None
+    return tuple(getattr(event, field) for field in fields)
+
+
+class DedupCache:
+    """
+    Bounded TTL set of the events published recently by this process.
+
+    An entry expires `ttl_s` after the event was first seen; later copies do
+    not extend it. When the set is full, the oldest entry is evicted.
+
+    An event is reserved before it is published and released if publishing
+    fails, so a retried event is not mistaken for a duplicate, and two
+    concurrent copies of an event are only published once.
+    """
+
+    def __init__(self, max_entries: int = DEDUP_CACHE_SIZE, ttl_s: float = DEDUP_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # key -> expiry time, in insertion order, so oldest first
+        self._entries: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, expires_at = next(iter(self._entries.items()))
+            if expires_at > now:
+                return
+            del self._entries[key]
+
+    def reserve(self, topic: str, identity: Optional[Tuple]) -> bool:
+        """
+        Return False when the event was already seen, otherwise record it.
+        """
+        if not self.enabled or identity is None:
+            return True
+        key = (topic, identity)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            duplicate = key in self._entries
+            if not duplicate:
+                self._entries[key] = now + self.ttl_s
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        DEDUP_LOOKUPS.labels(topic, "hit" if duplicate else "miss").inc()
+        return not duplicate
+
+    def release(self, topic: str, identity: Optional[Tuple]):
+        """
+        Forget an event that could not be published.
+        """
+        if not self.enabled or identity is None:
+            return
+        with self._lock:
+            self._entries.pop((topic, identity), None)
+
+
+dedup_cache = DedupCache()
@@ -0,0 +1,249 @@
+"""
+Decoding of batch request bodies.
+
+Bodies are sent as a JSON list, NDJSON or MessagePack (`Content-Type`),
+optionally compressed with gzip or zstd (`Content-Encoding`). They are
+decompressed and split into items while they are received, and the decoded
+size is bounded by `API_MAX_DECODED_BODY_BYTES`.
+"""
+import zlib
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from fastapi import Request, exceptions
+
+from app.settings.variables import API_MAX_DECODED_BODY_BYTES
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def media_type(request: Request) -> str:
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+def is_ndjson(request: Request) -> bool:
+    return media_type(request) in NDJSON_CONTENT_TYPES
+
+
+def is_msgpack(request: Request) -> bool:
+    return media_type(request) in MSGPACK_CONTENT_TYPES
+
+
+def unsupported(detail: str) -> exceptions.HTTPException:
+    return exceptions.HTTPException(status_code=415, detail=detail)
+
+
+# Largest piece of decoded body produced at once
+DECODED_PIECE_BYTES = 64 * 1024
+# zstd expands a few input bytes into a whole block, at most about 32768:1,
+# so feeding 32 bytes at a time bounds each call to about 1 MB of output
+ZSTD_INPUT_SLICE_BYTES = 32
+
+
+class GzipDecoder:
+    """
+    Incremental gzip decoder producing pieces of at most `DECODED_PIECE_BYTES`.
+    """
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    @property
+    def eof(self) -> bool:
+        return self._decompressor.eof
+
+    @property
+    def unused_data(self) -> bytes:
+        return self._decompressor.unused_data
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        while True:
+            piece = self._decompressor.decompress(data, DECODED_PIECE_BYTES)
+            data = self._decompressor.unconsumed_tail
+            if piece:
+                yield piece
+            if not data and len(piece) < DECODED_PIECE_BYTES:
+                return
+
+
+class ZstdDecoder:
+    """
+    Incremental zstd decoder producing pieces of at most about
+    `DECODED_PIECE_BYTES` plus 1 MB.
+
+    The decompression object has no output limit, so the input is fed in
+    slices of `ZSTD_INPUT_SLICE_BYTES` and the output is checked in between.
+    """
+
+    def __init__(self, zstandard):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    @property
+    def eof(self) -> bool:
+        return self._decompressor.eof
+
+    @property
+    def unused_data(self) -> bytes:
+        return self._decompressor.unused_data
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        data = memoryview(data)
+        pieces: List[bytes] = []
+        size = 0
+        for start in range(0, len(data), ZSTD_INPUT_SLICE_BYTES):
+            piece = self._decompressor.decompress(data[start:start + ZSTD_INPUT_SLICE_BYTES])
+            if piece:
+                pieces.append(piece)
+                size += len(piece)
+            if size >= DECODED_PIECE_BYTES:
+                yield b"".join(pieces)
+                pieces, size = [], 0
+        if pieces:
+            yield b"".join(pieces)
+
+
+def decoder_for(content_encoding: str) -> Optional[Any]:
+    """
+    Return an incremental decoder for `content_encoding`, or None when the
+    body is not compressed.
+    """
+    encoding = content_encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return GzipDecoder()
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise unsupported("zstd bodies need the zstandard package")
+        return ZstdDecoder(zstandard)
+    raise unsupported(f"Unsupported Content-Encoding: {content_encoding}")
+
+
+def body_too_large(max_bytes: int) -> exceptions.HTTPException:
+    return exceptions.HTTPException(
+        status_code=413, detail=f"Decoded body is larger than {max_bytes} bytes"
+    )
+
+
+async def iter_body(
+    request: Request, max_bytes: Optional[int] = API_MAX_DECODED_BODY_BYTES
+) -> AsyncIterator[bytes]:
+    """
+    Yield the decoded body of a request as it is received, rejecting bodies
+    larger than `max_bytes` once decoded, unless it is None.
+
+    Compressed chunks are decoded in bounded pieces and the size is checked
+    after each piece, so a small compressed body cannot expand in memory.
+    """
+    content_encoding = request.headers.get("content-encoding", "")
+    decoder = decoder_for(content_encoding)
+    size = 0
+    async for chunk in request.stream():
+        if not chunk:
+            continue
+        pieces = decoder.decode(chunk) if decoder is not None else iter((chunk,))
+        while True:
+            try:
+                piece = next(pieces, None)
+            except Exception as e:
+                raise exceptions.HTTPException(
+                    status_code=400, detail=f"Invalid {content_encoding} body: {e}"
+                )
+            if piece is None:
+                break
+            size += len(piece)
+            if max_bytes is not None and size > max_bytes:
+                raise body_too_large(max_bytes)
+            yield piece
+    if decoder is not None:
+        if not decoder.eof:
+            raise exceptions.HTTPException(
+                status_code=400, detail=f"Truncated {content_encoding} body"
+            )
+        if decoder.unused_data:
+            raise exceptions.HTTPException(
+                status_code=400, detail=f"Unexpected data after the {content_encoding} body"
+            )
+
+
+async def read_body(request: Request) -> bytes:
+    """
+    Return the whole decoded body of a request.
+    """
+    return b"".join([chunk async for chunk in iter_body(request)])
+
+
+def line_too_long(max_line_bytes: int) -> exceptions.HTTPException:
+    return exceptions.HTTPException(
+        status_code=413, detail=f"Item larger than {max_line_bytes} bytes"
+    )
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yield the non-empty lines of an NDJSON body as they are received,
+    rejecting lines longer than `max_line_bytes` unless it is None.
+
+    The incomplete line is kept in a buffer that only grows, and only the
+    new chunk is searched for line breaks, so a long line is not copied
+    and scanned again for every chunk.
+    """
+    pending = bytearray()
+    async for chunk in chunks:
+        view = memoryview(chunk)
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            length = len(pending) + (len(chunk) if end == -1 else end) - start
+            if max_line_bytes is not None and length > max_line_bytes:
+                raise line_too_long(max_line_bytes)
+            if end == -1:
+                pending += view[start:]
+                break
+            pending += view[start:end]
+            line = bytes(pending)
+            pending.clear()
+            start = end + 1
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield bytes(pending)
+
+
+async def iter_msgpack_items(
+    chunks: AsyncIterator[bytes], max_item_bytes: int = API_MAX_DECODED_BODY_BYTES
+) -> AsyncIterator[Any]:
+    """
+    Yield the items of a MessagePack body as they are received.
+
+    The body is either a sequence of maps or a single array of maps, no
+    larger than `max_item_bytes`. Timestamps are decoded to timezone-aware
+    datetimes.
+    """
+    try:
+        import msgpack
+    except ImportError:
+        raise unsupported("MessagePack bodies need the msgpack package")
+    unpacker = msgpack.Unpacker(raw=False, timestamp=3, max_buffer_size=max_item_bytes)
+    fed = 0
+    async for chunk in chunks:
+        try:
+            unpacker.feed(chunk)
+        except msgpack.BufferFull:
+            raise line_too_long(max_item_bytes)
+        fed += len(chunk)
+        try:
+            for item in unpacker:
+                if isinstance(item, list):
+                    for element in item:
+                        yield element
+                else:
+                    yield item
+        except (ValueError, msgpack.UnpackException) as e:
+            raise exceptions.HTTPException(status_code=400, detail=f"Invalid MessagePack: {e}")
+    if unpacker.tell() < fed:
+        raise exceptions.HTTPException(status_code=400, detail="Truncated MessagePack body")
@@ -0,0 +1,116 @@
+"""
+Registry of the events accepted by the API.
+
+Each (Airflow version, event type) pair maps to its model, Kafka topic and
+key fields; routes, Avro schemas and topic warm-up are all derived from it.
+Supporting a new event type is a matter of adding an entry to
+`EVENT_PIPELINES`.
+"""
+import functools
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Type
+
+from pydantic import TypeAdapter
+
+from app.models.airflow_v2.dag_run import DagRun as DagRunV2
+from app.models.airflow_v2.task_instance import TaskInstance as TaskInstanceV2
+from app.models.airflow_v3.dag_run import DagRun as DagRunV3
+from app.models.airflow_v3.task_instance import TaskInstance as TaskInstanceV3
+from app.models.base import AvroBase
+from app.settings.variables import (
+    KAFKA_AIRFLOW_V2_DAG_RUN_TOPIC_NAME,
+    KAFKA_AIRFLOW_V2_TASK_INSTANCE_TOPIC_NAME,
+    KAFKA_AIRFLOW_V3_DAG_RUN_TOPIC_NAME,
+    KAFKA_AIRFLOW_V3_TASK_INSTANCE_TOPIC_NAME,
+)
+
+
+@dataclass(frozen=True)
+class EventPipeline:
+    version: str
+    event_type: str
+    model: Type[AvroBase]
+    topic: str
+    key_fields: Tuple[str, ...]
+    # Fields identifying a state transition, used to drop repeated events
+    identity_fields: Tuple[str, ...] = ()
+
+    @functools.cached_property
+    def adapter(self) -> TypeAdapter:
+        """
+        Validator of the event, used to validate raw JSON bodies.
+        """
+        return TypeAdapter(self.model)
+
+    @functools.cached_property
+    def avro_schemas(self) -> Tuple[str, str]:
+        """
+        The (key, value) Avro schemas of the event as JSON strings.
+        """
+        schema_value = self.model.avro_schema()
+        schema_key = {
+            "type": "record",
+            "name": "key",
+            "fields": [
+                field for field in schema_value["fields"] if field["name"] in self.key_fields
+            ],
+        }
+        return json.dumps(schema_key), json.dumps(schema_value)
+
+
+DAG_RUN_IDENTITY = ("dag_id", "run_id", "clear_number", "state")
+TASK_INSTANCE_IDENTITY = ("dag_id", "run_id", "task_id", "map_index", "try_number", "state")
+
+EVENT_PIPELINES: Dict[Tuple[str, str], EventPipeline] = {
+    (pipeline.version, pipeline.event_type): pipeline
+    for pipeline in (
+        EventPipeline(
+            "v2", "dag_run", DagRunV2, KAFKA_AIRFLOW_V2_DAG_RUN_TOPIC_NAME, ("dag_id",), DAG_RUN_IDENTITY
+        ),
+        EventPipeline(
+            "v2",
+            "task_instance",
+            TaskInstanceV2,
+            KAFKA_AIRFLOW_V2_TASK_INSTANCE_TOPIC_NAME,
+            ("dag_id", "task_id"),
+            TASK_INSTANCE_IDENTITY,
+        ),
+        EventPipeline(
+            "v3", "dag_run", DagRunV3, KAFKA_AIRFLOW_V3_DAG_RUN_TOPIC_NAME, ("dag_id",), DAG_RUN_IDENTITY
+        ),
+        EventPipeline(
+            "v3",
+            "task_instance",
+            TaskInstanceV3,
+            KAFKA_AIRFLOW_V3_TASK_INSTANCE_TOPIC_NAME,
+            ("dag_id", "task_id"),
+            TASK_INSTANCE_IDENTITY,
+        ),
+    )
+}
+
+_PIPELINES_BY_TOPIC: Dict[Tuple[str, str], EventPipeline] = {
+    (pipeline.topic, pipeline.version): pipeline for pipeline in EVENT_PIPELINES.values()
+}
+
+AIRFLOW_VERSIONS = tuple(dict.fromkeys(version for version, _ in EVENT_PIPELINES))
+TOPICS = tuple(dict.fromkeys(pipeline.topic for pipeline in EVENT_PIPELINES.values()))
+
+
+def get_pipeline(version: str, event_type: str) -> EventPipeline:
+    try:
+        return EVENT_PIPELINES[(version, event_type)]
+    except KeyError:
+        raise ValueError(f"Unknown event type {event_type} for Airflow {version}")
+
+
+def get_pipeline_for_topic(topic: str, version: str) -> EventPipeline:
+    try:
+        return _PIPELINES_BY_TOPIC[(topic, version)]
+    except KeyError:
+        raise ValueError(f"Unknown topic {topic} for Airflow {version}")
+
+
+def pipelines_for_version(version: str) -> List[EventPipeline]:
+    return [pipeline for pipeline in EVENT_PIPELINES.values() if pipeline.version == version]
@@ -0,0 +1,137 @@
+from typing import Any
+from fastapi import APIRouter, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from app.api.controllers.batch import (
+    iter_stream_items,
+    publish_batch,
+    publish_stream,
+    read_batch_items,
+)
+from app.api.controllers.common import publish_message
+from app.api.controllers.pipelines import EventPipeline, pipelines_for_version
+from app.settings.variables import API_FAST_VALIDATION
+
+
+def request_validation_error(error: ValidationError) -> RequestValidationError:
+    """
+    Report a body validation error like FastAPI does for declared bodies.
+    """
+    return RequestValidationError(
+        [{**err, "loc": ("body", *err["loc"])} for err in error.errors(include_url=False)]
+    )
+
+
+def add_event_routes(router: APIRouter, pipeline: EventPipeline):
+    """
+    Add the single event and batch routes of an event pipeline.
+
+    With `API_FAST_VALIDATION`, the single event route validates the raw
+    body with the pipeline `TypeAdapter` and answers with the model encoded
+    by pydantic-core, skipping the intermediate Python objects.
+    """
+    model = pipeline.model
+
+    async def publish_event(event: model):
+        await publish_message(
+            topic=pipeline.topic,
+            version=pipeline.version,
+            event=event,
+            key_fields=pipeline.key_fields,
+            identity_fields=pipeline.identity_fields,
+        )
+        return event.model_dump()
+
+    async def publish_event_raw(request: Request):
+        try:
+            event = pipeline.adapter.validate_json(await request.body())
+        except ValidationError as e:
+            raise request_validation_error(e)
+        await publish_message(
+            topic=pipeline.topic,
+            version=pipeline.version,
+            event=event,
+            key_fields=pipeline.key_fields,
+            identity_fields=pipeline.identity_fields,
+        )
+        return Response(
+            content=pipeline.adapter.dump_json(event), media_type="application/json"
+        )
+
+    async def publish_event_batch(request: Request):
+        items = await read_batch_items(request, raw_lines=API_FAST_VALIDATION)
+        return await publish_batch(
+            items,
+            model=model,
+            topic=pipeline.topic,
+            version=pipeline.version,
+            key_fields=pipeline.key_fields,
+            adapter=pipeline.adapter,
+            identity_fields=pipeline.identity_fields,
+        )
+
+    async def publish_event_stream(request: Request):
+        return await publish_stream(
+            iter_stream_items(request),
+            model=model,
+            topic=pipeline.topic,
+            version=pipeline.version,
+            key_fields=pipeline.key_fields,
+            adapter=pipeline.adapter,
+            identity_fields=pipeline.identity_fields,
+        )
+
+    event_name = pipeline.event_type.replace("_", " ")
+    if API_FAST_VALIDATION:
+        router.add_api_route(
+            f"/events/{pipeline.event_type}",
+            publish_event_raw,
+            methods=["POST"],
+            status_code=status.HTTP_200_OK,
+            name=f"publish_{pipeline.event_type}_state",
+            description=f"Publish an Airflow {pipeline.version} {event_name} event.",
+            openapi_extra={
+                "requestBody": {
+                    "content": {"application/json": {"schema": model.model_json_schema()}},
+                    "required": True,
+                }
+            },
+        )
+    else:
+        router.add_api_route(
+            f"/events/{pipeline.event_type}",
+            publish_event,
+            methods=["POST"],
+            status_code=status.HTTP_200_OK,
+            response_model=dict[str, Any],
+            name=f"publish_{pipeline.event_type}_state",
+            description=f"Publish an Airflow {pipeline.version} {event_name} event.",
+        )
+    router.add_api_route(
+        f"/events/{pipeline.event_type}/batch",
+        publish_event_batch,
+        methods=["POST"],
+        status_code=status.HTTP_200_OK,
+        response_model=dict[str, Any],
+        name=f"publish_{pipeline.event_type}_state_batch",
+        description=f"Publish a batch of Airflow {pipeline.version} {event_name} events, sent as a JSON list, NDJSON or MessagePack, optionally gzip or zstd compressed.",
+    )
+    router.add_api_route(
+        f"/events/{pipeline.event_type}/stream",
+        publish_event_stream,
+        methods=["POST"],
+        status_code=status.HTTP_200_OK,
+        response_model=dict[str, Any],
+        name=f"publish_{pipeline.event_type}_state_stream",
+        description=f"Publish a stream of Airflow {pipeline.version} {event_name} events sent as NDJSON or MessagePack, produced as they arrive.",
+    )
+
+
+def build_router(version: str) -> APIRouter:
+    """
+    Build the routes of every event pipeline of an Airflow version.
+    """
+    router = APIRouter()
+    for pipeline in pipelines_for_version(version):
+        add_event_routes(router, pipeline)
+    return router
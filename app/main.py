@@ -1,21 +1,122 @@
-from fastapi import FastAPI
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
+from confluent_kafka import KafkaException
 import logging
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.api.controllers.avro import warm_avro_serializers
+from app.api.controllers.pipelines import TOPICS
 from app.api.routes import api_router
+from app.metrics import MetricsMiddleware, render_metrics
+from app.readiness import get_readiness_prober, start_readiness_prober, stop_readiness_prober
+from app.settings.kafka import (
+    close_producer,
+    get_producer,
+    prefetch_topic_metadata,
+    start_delivery_poller,
+    transactional_producer,
+    transactions_enabled,
+)
+from app.settings.kafka_statistics import producer_statistics
+from app.settings.msk_auth import get_token_manager
+from app.settings.variables import (
+    KAFKA_SHUTDOWN_DRAIN_TIMEOUT_S,
+    KAFKA_STARTUP_METADATA_TIMEOUT_S,
+    LOGGING_LEVEL,
+    SCHEMA_REGISTRY_URL,
+)
+from app.spool import close_spool, get_spool, spool_enabled
+
+logging.basicConfig(level=LOGGING_LEVEL)
+
+def find_env_file() -> Optional[str]:
+    """
+    Return the closest `.env` file above this module, like `find_dotenv`.
+    """
+    path = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        candidate = os.path.join(path, ".env")
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
 
-logging.basicConfig(level=logging.INFO)
 
-from dotenv import load_dotenv
-load_dotenv()
+# python-dotenv is only imported when there is a file to load
+env_file = find_env_file()
+if env_file is not None:
+    from dotenv import load_dotenv
+    load_dotenv(env_file)
 
 APP_NAME = "Airflow Listener to Kafka"
 DESCRIPTION = "API to send events from Airflow to Kafka's topic"
 
+def warm_up():
+    """
+    Build the producer and fetch everything the first requests need.
+    """
+    logger = logging.getLogger("warm_up")
+    token_manager = get_token_manager()
+    if token_manager is not None:
+        # Fetch the MSK auth token before the producer asks for it
+        try:
+            token_manager.token()
+        except Exception as e:
+            # Fetched again by the producer's oauth_cb
+            logger.warning(f"Could not fetch the MSK auth token: {e}")
+    get_producer()
+    prefetch_topic_metadata(TOPICS, timeout=KAFKA_STARTUP_METADATA_TIMEOUT_S)
+    if SCHEMA_REGISTRY_URL is not None:
+        try:
+            warm_avro_serializers()
+        except Exception as e:
+            # The serializers are built again on first use
+            logger.warning(f"Could not register the Avro schemas: {e}")
+    if transactions_enabled():
+        try:
+            with transactional_producer():
+                pass
+        except KafkaException as e:
+            # Retried by the first batch
+            logger.warning(f"Could not initialize the transactional producer: {e}")
+    # Serves the delivery reports awaited by requests, in every publish mode
+    start_delivery_poller()
+    if spool_enabled():
+        # Start draining events left in the spool by a previous run
+        get_spool()
+    start_readiness_prober(TOPICS)
+
+
+def drain(timeout: float):
+    """
+    Deliver the spooled and queued messages, within `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    stop_readiness_prober(timeout=1)
+    close_spool(timeout=timeout)
+    close_producer(timeout=max(0.0, deadline - time.monotonic()))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(warm_up)
+    yield
+    await run_in_threadpool(drain, KAFKA_SHUTDOWN_DRAIN_TIMEOUT_S)
+
+
 app = FastAPI(
     title=APP_NAME,
     description=DESCRIPTION,
     # redoc_url=None,
     # docs_url=None
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -25,9 +126,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/health", status_code=200)
 async def health():
     return {"status": "healthy"}
 
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    prober = get_readiness_prober()
+    status = prober.status() if prober is not None else {"ready": False, "reason": "starting"}
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/debug/kafka/statistics", include_in_schema=False)
+async def kafka_statistics():
+    stats = producer_statistics.latest()
+    if stats is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No statistics yet, set KAFKA_STATISTICS_INTERVAL_MS to enable them",
+        )
+    return stats
+
 app.include_router(api_router, prefix="/api/v1")
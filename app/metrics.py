@@ -0,0 +1,218 @@
+import os
+import re
+import time
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.settings.kafka import get_producer
+from app.settings.kafka_statistics import producer_statistics
+from app.settings.msk_auth import get_token_manager
+from app.spool import get_spool, spool_enabled
+
+AIRFLOW_VERSION_PATTERN = re.compile(r"/airflow_(v\d+)/")
+
+REQUESTS = Counter(
+    "api_requests_total",
+    "HTTP requests handled, per route and Airflow version.",
+    ["method", "route", "airflow_version", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "api_request_duration_seconds",
+    "HTTP request latency, per route and Airflow version.",
+    ["method", "route", "airflow_version"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REJECTIONS = Counter(
+    "api_rejected_requests_total",
+    "Requests rejected by admission control, per reason.",
+    ["reason"],
+)
+DEDUP_LOOKUPS = Counter(
+    "api_dedup_lookups_total",
+    "Events checked against the deduplication cache, per topic and result (hit = duplicate dropped).",
+    ["topic", "result"],
+)
+DELIVERIES = Counter(
+    "kafka_deliveries_total",
+    "Kafka message deliveries, per topic and outcome.",
+    ["topic", "outcome"],
+)
+SERIALIZATION_DURATION = Histogram(
+    "serialization_duration_seconds",
+    "Time spent serializing a message and its key, per format.",
+    ["format"],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+FLUSH_DURATION = Histogram(
+    "kafka_flush_duration_seconds",
+    "Time spent waiting for the delivery reports of a request.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+# Gauges read from the producer and the spool of the process answering the
+# scrape; with several workers they are not aggregated across processes
+PROCESS_REGISTRY = CollectorRegistry()
+
+
+class ProducerQueueCollector:
+    """
+    Export the producer queue length, the spool size and the auth token expiry.
+    """
+
+    def collect(self):
+        queue_length = GaugeMetricFamily(
+            "kafka_producer_queue_length",
+            "Messages and requests waiting in the librdkafka producer queue.",
+        )
+        queue_length.add_metric([], len(get_producer()))
+        yield queue_length
+
+        spool_size = GaugeMetricFamily(
+            "kafka_spool_size_bytes",
+            "Bytes in the local spool segments, delivered or not.",
+        )
+        spool_size.add_metric([], get_spool().size if spool_enabled() else 0)
+        yield spool_size
+
+        token_manager = get_token_manager()
+        if token_manager is not None and token_manager.expiry:
+            expiry = GaugeMetricFamily(
+                "kafka_oauth_token_expiry_timestamp_seconds",
+                "Expiry of the cached MSK IAM auth token, as a UNIX timestamp.",
+            )
+            expiry.add_metric([], token_manager.expiry)
+            yield expiry
+
+
+class ProducerStatisticsCollector:
+    """
+    Export the latest librdkafka statistics received through `stats_cb`.
+    """
+
+    BROKER_WINDOWS = {
+        "rtt": ("kafka_broker_rtt_seconds", "Broker round-trip time."),
+        "int_latency": (
+            "kafka_broker_queue_latency_seconds",
+            "Time messages spend in the producer queue before being sent.",
+        ),
+        "outbuf_latency": (
+            "kafka_broker_outbuf_latency_seconds",
+            "Time requests spend in the broker output buffer.",
+        ),
+    }
+    BROKER_COUNTERS = {
+        "txretries": ("kafka_broker_request_retries", "Requests retried to the broker."),
+        "txerrs": ("kafka_broker_request_errors", "Request errors to the broker."),
+        "req_timeouts": ("kafka_broker_request_timeouts", "Requests to the broker that timed out."),
+    }
+    TOPIC_WINDOWS = {
+        "batchsize": ("kafka_topic_batch_size_bytes", "Size of the batches sent for the topic."),
+        "batchcnt": ("kafka_topic_batch_messages", "Messages per batch sent for the topic."),
+    }
+    STAT_NAMES = ("avg", "p99")
+
+    def collect(self):
+        stats = producer_statistics.latest()
+        if stats is None:
+            return
+
+        age = GaugeMetricFamily(
+            "kafka_statistics_age_seconds", "Age of the latest librdkafka statistics."
+        )
+        age.add_metric([], time.time() - stats["received_at"])
+        yield age
+
+        for field, (name, documentation) in self.BROKER_WINDOWS.items():
+            family = GaugeMetricFamily(name, documentation, labels=["broker", "stat"])
+            for broker, broker_stats in stats["brokers"].items():
+                for stat in self.STAT_NAMES:
+                    value = broker_stats[field].get(stat)
+                    if value is not None:
+                        family.add_metric([broker, stat], value / 1e6)
+            yield family
+
+        for field, (name, documentation) in self.BROKER_COUNTERS.items():
+            family = CounterMetricFamily(name, documentation, labels=["broker"])
+            for broker, broker_stats in stats["brokers"].items():
+                if broker_stats.get(field) is not None:
+                    family.add_metric([broker], broker_stats[field])
+            yield family
+
+        for field, (name, documentation) in self.TOPIC_WINDOWS.items():
+            family = GaugeMetricFamily(name, documentation, labels=["topic", "stat"])
+            for topic, topic_stats in stats["topics"].items():
+                for stat in self.STAT_NAMES:
+                    value = topic_stats[field].get(stat)
+                    if value is not None:
+                        family.add_metric([topic, stat], value)
+            yield family
+
+        queued = GaugeMetricFamily(
+            "kafka_topic_queued_messages",
+            "Messages waiting to be sent for the topic.",
+            labels=["topic"],
+        )
+        for topic, topic_stats in stats["topics"].items():
+            queued.add_metric([topic], topic_stats["msgq_cnt"] + topic_stats["xmit_msgq_cnt"])
+        yield queued
+
+
+PROCESS_REGISTRY.register(ProducerQueueCollector())
+PROCESS_REGISTRY.register(ProducerStatisticsCollector())
+
+
+def render_metrics() -> bytes:
+    """
+    Render the metrics in the Prometheus text format.
+
+    When `PROMETHEUS_MULTIPROC_DIR` is set (several workers), counters and
+    histograms are aggregated across all the worker processes.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(PROCESS_REGISTRY)
+
+
+def airflow_version(route_path: str) -> str:
+    match = AIRFLOW_VERSION_PATTERN.search(route_path)
+    return match.group(1) if match else "none"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts and latencies.
+
+    Requests are labelled with the route template rather than the raw path,
+    so the label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            version = airflow_version(route_path)
+            REQUEST_DURATION.labels(scope["method"], route_path, version).observe(duration)
+            REQUESTS.labels(scope["method"], route_path, version, str(status_code)).inc()
@@ -1,8 +1,12 @@
 # Code from https://github.com/godatadriven/pydantic-avro
-from typing import Any, Dict, List, Optional, Set
+import json
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
 from pydantic import BaseModel
 from pydantic import VERSION as PYDANTIC_VERSION
 
+from app.settings.variables import AVRO_SCHEMA_DIR
+
 PYDANTIC_V2 = PYDANTIC_VERSION.startswith("2.")
 DEFS_NAME = "$defs" if PYDANTIC_V2 else "definitions"
 
@@ -296,6 +300,10 @@ class AvroTypeConverter:
         return avro_type_dict
 
 
+_AVRO_SCHEMAS: Dict[Tuple[type, bool, Optional[str]], dict] = {}
+_PARSED_AVRO_SCHEMAS: Dict[Tuple[type, bool, Optional[str]], dict] = {}
+
+
 class AvroBase(BaseModel):
     """This class provides functionality to convert a pydantic model to an Avro schema."""
 
@@ -305,10 +313,60 @@ class AvroBase(BaseModel):
     ) -> dict:
         """Returns the avro schema for the pydantic class
 
+        Schemas are generated once per (class, by_alias, namespace) and the
+        cached dict is returned afterwards, so it must not be mutated. The
+        default schema is read from `AVRO_SCHEMA_DIR` when it was generated
+        ahead of time.
+
         :param by_alias: generate the schemas using the aliases defined, if any
         :param namespace: Provide an optional namespace string to use in schema generation
         :return: dict with the Avro Schema for the model
         """
+        cache_key = (cls, by_alias, namespace)
+        schema = _AVRO_SCHEMAS.get(cache_key)
+        if schema is None:
+            if by_alias and namespace is None:
+                schema = cls._read_avro_schema_file()
+            if schema is None:
+                schema = cls.generate_avro_schema(by_alias, namespace)
+            _AVRO_SCHEMAS[cache_key] = schema
+        return schema
+
+    @classmethod
+    def parsed_avro_schema(
+        cls, by_alias: bool = True, namespace: Optional[str] = None
+    ) -> dict:
+        """Returns the avro schema parsed by fastavro, cached like `avro_schema`"""
+        cache_key = (cls, by_alias, namespace)
+        parsed_schema = _PARSED_AVRO_SCHEMAS.get(cache_key)
+        if parsed_schema is None:
+            import fastavro
+
+            parsed_schema = fastavro.parse_schema(cls.avro_schema(by_alias, namespace))
+            _PARSED_AVRO_SCHEMAS[cache_key] = parsed_schema
+        return parsed_schema
+
+    @classmethod
+    def avro_schema_file_name(cls) -> str:
+        """Returns the file name of the schema generated ahead of time"""
+        return f"{cls.__module__}.{cls.__qualname__}.avsc"
+
+    @classmethod
+    def _read_avro_schema_file(cls) -> Optional[dict]:
+        """Returns the schema generated ahead of time, if any"""
+        if AVRO_SCHEMA_DIR is None:
+            return None
+        path = os.path.join(AVRO_SCHEMA_DIR, cls.avro_schema_file_name())
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    @classmethod
+    def generate_avro_schema(
+        cls, by_alias: bool = True, namespace: Optional[str] = None
+    ) -> dict:
+        """Generates the avro schema for the pydantic class, bypassing the cache"""
         schema = (
             cls.model_json_schema(by_alias=by_alias)
             if PYDANTIC_V2
@@ -0,0 +1,31 @@
+"""
+Generate the Avro schemas of the API models ahead of time.
+
+Usage: python -m app.models.generate_avro_schemas <output directory>
+
+Point `AVRO_SCHEMA_DIR` to the output directory to load the schemas from
+there instead of generating them when the API runs.
+"""
+import json
+import os
+import sys
+
+from app.api.controllers.pipelines import EVENT_PIPELINES
+
+MODELS = tuple(dict.fromkeys(pipeline.model for pipeline in EVENT_PIPELINES.values()))
+
+
+def generate_avro_schemas(output_dir: str):
+    os.makedirs(output_dir, exist_ok=True)
+    for model in MODELS:
+        path = os.path.join(output_dir, model.avro_schema_file_name())
+        with open(path, "w") as f:
+            json.dump(model.generate_avro_schema(), f, indent=2)
+        print(f"Avro schema of {model.__module__}.{model.__qualname__} written to {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__.strip())
+        sys.exit(1)
+    generate_avro_schemas(sys.argv[1])
@@ -0,0 +1,176 @@
+"""
+Readiness of the API to deliver events, probed in the background.
+
+`/ready` only reads the cached result of the last probe, so Kubernetes
+probes never reach Kafka or the Schema Registry themselves.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional, Sequence
+
+from confluent_kafka import KafkaException
+
+from app.settings.kafka import get_producer, producer_queue_capacity
+from app.settings.variables import (
+    KAFKA_SPOOL_MAX_BYTES,
+    READINESS_PROBE_INTERVAL_S,
+    READINESS_PROBE_TIMEOUT_S,
+    READINESS_QUEUE_SATURATION,
+    SCHEMA_REGISTRY_URL,
+)
+from app.spool import get_spool, spool_enabled
+
+class ReadinessProber(threading.Thread):
+    """
+    Background thread checking the brokers, the topics, the Schema Registry
+    and the local queues every `interval` seconds.
+    """
+
+    def __init__(
+        self,
+        topics: Sequence[str],
+        interval: float = READINESS_PROBE_INTERVAL_S,
+        timeout: float = READINESS_PROBE_TIMEOUT_S,
+    ):
+        super().__init__(name="readiness-prober", daemon=True)
+        self.topics = tuple(topics)
+        self.interval = interval
+        self.timeout = timeout
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._result: Optional[Dict[str, Any]] = None
+        self._metadata_fetched_at: Optional[float] = None
+        # The Schema Registry client has no timeout: its calls run in their
+        # own thread so a hanging registry cannot stall the prober
+        self._registry_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="registry-probe")
+        self._registry_probe: Optional[Future] = None
+        self.queue_max_messages = producer_queue_capacity()
+
+    def probe_kafka(self) -> Dict[str, Any]:
+        producer = get_producer()
+        deadline = time.monotonic() + self.timeout
+        brokers = 0
+        errors = {}
+        for topic in self.topics:
+            try:
+                metadata = producer.list_topics(topic=topic, timeout=max(0.0, deadline - time.monotonic()))
+            except KafkaException as e:
+                errors[topic] = str(e.args[0])
+                continue
+            brokers = max(brokers, len(metadata.brokers))
+            topic_metadata = metadata.topics.get(topic)
+            if topic_metadata is None or topic_metadata.error is not None:
+                errors[topic] = str(topic_metadata.error) if topic_metadata is not None else "missing"
+        if not errors:
+            self._metadata_fetched_at = time.time()
+        age = time.time() - self._metadata_fetched_at if self._metadata_fetched_at else None
+        return {
+            "ok": not errors,
+            "brokers": brokers,
+            "topic_errors": errors,
+            "metadata_age_s": age,
+        }
+
+    def probe_schema_registry(self) -> Dict[str, Any]:
+        if SCHEMA_REGISTRY_URL is None:
+            return {"ok": True, "enabled": False}
+        # Imported here: avro imports the models and the serializers
+        from app.api.controllers.avro import get_schema_registry_client
+
+        if self._registry_probe is None or self._registry_probe.done():
+            self._registry_probe = self._registry_executor.submit(
+                lambda: get_schema_registry_client().get_subjects()
+            )
+        try:
+            subjects = self._registry_probe.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            return {"ok": False, "enabled": True, "error": f"No answer within {self.timeout}s"}
+        except Exception as e:
+            return {"ok": False, "enabled": True, "error": str(e)}
+        return {"ok": True, "enabled": True, "subjects": len(subjects)}
+
+    def probe_queues(self) -> Dict[str, Any]:
+        queued = len(get_producer())
+        saturation = queued / self.queue_max_messages
+        result = {
+            "ok": saturation < READINESS_QUEUE_SATURATION,
+            "producer_queue": queued,
+            "producer_queue_saturation": saturation,
+        }
+        if spool_enabled():
+            spool_saturation = get_spool().size / KAFKA_SPOOL_MAX_BYTES
+            result["spool_saturation"] = spool_saturation
+            result["ok"] = result["ok"] and spool_saturation < READINESS_QUEUE_SATURATION
+        return result
+
+    def probe(self) -> Dict[str, Any]:
+        checks = {
+            "kafka": self.probe_kafka(),
+            "schema_registry": self.probe_schema_registry(),
+            "queues": self.probe_queues(),
+        }
+        return {
+            "ready": all(check["ok"] for check in checks.values()),
+            "checked_at": time.time(),
+            "checks": checks,
+        }
+
+    def run(self):
+        logger = logging.getLogger("readiness")
+        ready = None
+        while not self._stop_event.is_set():
+            try:
+                result = self.probe()
+            except Exception as e:
+                result = {"ready": False, "checked_at": time.time(), "error": f"Probe failed: {e!r}"}
+            with self._lock:
+                self._result = result
+            if result["ready"] != ready:
+                ready = result["ready"]
+                log = logger.info if ready else logger.warning
+                log(f"API is {'ready' if ready else 'not ready'}: {result.get('checks', result.get('error'))}")
+            self._stop_event.wait(self.interval)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Return the last probe result, marked not ready before the first probe
+        or when the prober stopped updating it.
+        """
+        with self._lock:
+            result = self._result
+        if result is None:
+            return {"ready": False, "reason": "starting"}
+        age = time.time() - result["checked_at"]
+        if age > 3 * self.interval + self.timeout:
+            return {**result, "ready": False, "reason": f"last probe is {age:.0f}s old"}
+        return result
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        self.join(timeout=timeout)
+        self._registry_executor.shutdown(wait=False)
+
+
+_readiness_prober: Optional[ReadinessProber] = None
+
+
+def start_readiness_prober(topics: Sequence[str]) -> ReadinessProber:
+    global _readiness_prober
+    if _readiness_prober is None:
+        _readiness_prober = ReadinessProber(topics)
+        _readiness_prober.start()
+    return _readiness_prober
+
+
+def get_readiness_prober() -> Optional[ReadinessProber]:
+    return _readiness_prober
+
+
+def stop_readiness_prober(timeout: Optional[float] = None):
+    global _readiness_prober
+    if _readiness_prober is not None:
+        _readiness_prober.stop(timeout=timeout)
+        _readiness_prober = None
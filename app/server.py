@@ -0,0 +1,73 @@
+"""
+Production entry point: `python -m app.server`.
+
+Runs `API_WORKERS` uvicorn worker processes, or one per CPU available to the
+container when it is 0. Workers share nothing: each one builds its own Kafka
+producer on first use, owns its own spool directory and flushes its producer
+when it shuts down.
+"""
+import glob
+import logging
+import math
+import os
+import tempfile
+
+import uvicorn
+
+from app.settings.variables import API_HOST, API_PORT, API_WORKERS, LOGGING_LEVEL
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process may use, honouring the affinity mask and the cgroup v2
+    CPU quota (Kubernetes limits).
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def worker_count() -> int:
+    return API_WORKERS if API_WORKERS > 0 else available_cpus()
+
+
+def prepare_prometheus_multiproc_dir():
+    """
+    Point prometheus_client to a clean shared directory, so `/metrics`
+    aggregates the counters and histograms of every worker.
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="prometheus-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+
+
+def main():
+    logging.basicConfig(level=LOGGING_LEVEL)
+    workers = worker_count()
+    if workers > 1:
+        prepare_prometheus_multiproc_dir()
+    logging.getLogger("server").info(f"Starting {workers} worker(s) on {API_HOST}:{API_PORT}")
+    uvicorn.run(
+        "app.main:app",
+        host=API_HOST,
+        port=API_PORT,
+        workers=workers,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,331 @@
+import contextlib
 import logging
-from confluent_kafka import Producer as ConfluentKafkaProducer
-from app.settings.variables import KAFKA_BOOTSTRAP_SERVERS, KAFKA_MSK_AWS_REGION
-from aws_msk_iam_sasl_signer import MSKAuthTokenProvider
+import os
+import socket
+import threading
+import time
+from confluent_kafka import KafkaException, Producer as ConfluentKafkaProducer
+from app.settings.kafka_statistics import stats_cb
+from app.settings.variables import (
+    KAFKA_BOOTSTRAP_SERVERS,
+    KAFKA_DELIVERY_SEMANTICS,
+    KAFKA_DELIVERY_TIMEOUT_S,
+    KAFKA_MSK_AWS_REGION,
+    KAFKA_POLL_INTERVAL_S,
+    KAFKA_PRODUCER_CONFIG,
+    KAFKA_PRODUCER_PROFILE,
+    KAFKA_STATISTICS_INTERVAL_MS,
+    KAFKA_TRANSACTIONAL_ID_PREFIX,
+)
+from app.settings.msk_auth import get_token_manager, stop_token_manager
 
 
 def oauth_cb(oauth_config):
     logger = logging.getLogger("oauth_cb")
     logger.debug(f"oauth_cb: {oauth_config}")
-    auth_token, expiry_ms = MSKAuthTokenProvider.generate_auth_token(
-        KAFKA_MSK_AWS_REGION, aws_debug_creds=True
-    )
-    return auth_token, expiry_ms / 1000
+    return get_token_manager().token()
+
+
+# Named sets of librdkafka settings, applied on top of the connection settings
+PRODUCER_PROFILES = {
+    "default": {},
+    "throughput": {
+        "linger.ms": 20,
+        "batch.num.messages": 10000,
+        "batch.size": 1048576,
+        "compression.type": "zstd",
+        "queue.buffering.max.kbytes": 1048576,
+        "acks": "all",
+        "enable.idempotence": True,
+    },
+    "latency": {
+        "linger.ms": 0,
+        "compression.type": "lz4",
+        "acks": 1,
+        "socket.nagle.disable": True,
+    },
+}
+
+# librdkafka default of queue.buffering.max.messages
+DEFAULT_QUEUE_MAX_MESSAGES = 100000
+
+DELIVERY_SEMANTICS = ("at_least_once", "idempotent", "transactional")
+
+SECRET_CONFIG_KEYWORDS = ("password", "secret", "token", "key.pem", "credentials")
+
+
+def statistics_config() -> dict:
+    if KAFKA_STATISTICS_INTERVAL_MS <= 0:
+        return {}
+    return {
+        "statistics.interval.ms": KAFKA_STATISTICS_INTERVAL_MS,
+        "stats_cb": stats_cb,
+    }
 
 
-def producer_builder():
+def connection_config() -> dict:
     logger = logging.getLogger("producer_builder")
     if KAFKA_MSK_AWS_REGION is not None:
         logger.info("Using MSK Kafka with IAM Access Control authentication")
-        return ConfluentKafkaProducer(
-            {
-                "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
-                "security.protocol": "SASL_SSL",
-                "sasl.mechanisms": "OAUTHBEARER",
-                "oauth_cb": oauth_cb,
-            }
-        )
+        return {
+            "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
+            "security.protocol": "SASL_SSL",
+            "sasl.mechanisms": "OAUTHBEARER",
+            "oauth_cb": oauth_cb,
+        }
     else:  # Local Kafka
         logger.info("Using Local Kafka with no authentication")
-        return ConfluentKafkaProducer(
-            {
-                "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
-                "security.protocol": "PLAINTEXT",
-            }
+        return {
+            "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
+            "security.protocol": "PLAINTEXT",
+        }
+
+
+def delivery_semantics_config() -> dict:
+    if KAFKA_DELIVERY_SEMANTICS not in DELIVERY_SEMANTICS:
+        raise ValueError(
+            f"Unknown KAFKA_DELIVERY_SEMANTICS: {KAFKA_DELIVERY_SEMANTICS}. "
+            f"Expected one of {', '.join(DELIVERY_SEMANTICS)}"
+        )
+    if KAFKA_DELIVERY_SEMANTICS == "at_least_once":
+        return {}
+    # Retries can no longer duplicate or reorder messages within a partition
+    return {"enable.idempotence": True, "acks": "all"}
+
+
+def producer_config() -> dict:
+    """
+    Build the librdkafka configuration of the producer.
+
+    Later sources override earlier ones: connection settings, the
+    `KAFKA_PRODUCER_PROFILE` profile, `KAFKA_DELIVERY_SEMANTICS`,
+    statistics, then the `KAFKA_PRODUCER_*` environment variables.
+    """
+    if KAFKA_PRODUCER_PROFILE not in PRODUCER_PROFILES:
+        raise ValueError(
+            f"Unknown KAFKA_PRODUCER_PROFILE: {KAFKA_PRODUCER_PROFILE}. "
+            f"Expected one of {', '.join(PRODUCER_PROFILES)}"
         )
+    return {
+        **connection_config(),
+        **PRODUCER_PROFILES[KAFKA_PRODUCER_PROFILE],
+        **delivery_semantics_config(),
+        **statistics_config(),
+        **KAFKA_PRODUCER_CONFIG,
+    }
+
+
+def transactional_id() -> str:
+    """
+    Transactional id of the process: unique per pod and worker process.
+    """
+    return f"{KAFKA_TRANSACTIONAL_ID_PREFIX}-{socket.gethostname()}-{os.getpid()}"
+
+
+def producer_queue_capacity() -> int:
+    """
+    Maximum number of messages in the librdkafka producer queue.
+
+    Only the sources that can set it are read, so unlike `producer_config()`
+    this neither logs nor validates the rest of the configuration.
+    """
+    for source in (KAFKA_PRODUCER_CONFIG, PRODUCER_PROFILES.get(KAFKA_PRODUCER_PROFILE, {})):
+        if "queue.buffering.max.messages" in source:
+            return int(source["queue.buffering.max.messages"])
+    return DEFAULT_QUEUE_MAX_MESSAGES
+
+
+def redacted_config(config: dict) -> dict:
+    redacted = {}
+    for key, value in config.items():
+        if callable(value):
+            redacted[key] = f"<{getattr(value, '__name__', type(value).__name__)}>"
+        elif any(keyword in key for keyword in SECRET_CONFIG_KEYWORDS):
+            redacted[key] = "<redacted>"
+        else:
+            redacted[key] = value
+    return redacted
+
+
+def producer_builder(extra_config: dict | None = None):
+    logger = logging.getLogger("producer_builder")
+    config = {**producer_config(), **(extra_config or {})}
+    logger.info(
+        f"Kafka producer configuration (profile {KAFKA_PRODUCER_PROFILE}): "
+        f"{redacted_config(config)}"
+    )
+    try:
+        return ConfluentKafkaProducer(config)
+    except KafkaException as e:
+        logger.error(f"Invalid Kafka producer configuration: {e}")
+        raise
+
+
+def transactional_producer_builder():
+    """
+    Build a producer for transactions and register its transactional id.
+    """
+    producer = producer_builder({"transactional.id": transactional_id()})
+    producer.init_transactions(KAFKA_DELIVERY_TIMEOUT_S)
+    return producer
+
+
+def prefetch_topic_metadata(topics, timeout: float) -> bool:
+    """
+    Fetch the metadata of `topics` so the first messages do not wait for it.
+
+    Returns False, after logging why, when a topic is unknown or the brokers
+    did not answer within `timeout` seconds overall.
+    """
+    logger = logging.getLogger("prefetch_topic_metadata")
+    producer = get_producer()
+    deadline = time.monotonic() + timeout
+    ok = True
+    for topic in topics:
+        try:
+            metadata = producer.list_topics(topic=topic, timeout=max(0.0, deadline - time.monotonic()))
+        except KafkaException as e:
+            logger.warning(f"Could not fetch metadata for topic {topic}: {e}")
+            ok = False
+            continue
+        topic_metadata = metadata.topics.get(topic)
+        if topic_metadata is None or topic_metadata.error is not None:
+            error = topic_metadata.error if topic_metadata is not None else "missing"
+            logger.warning(f"Topic {topic} is not available: {error}")
+            ok = False
+        else:
+            logger.info(f"Metadata fetched for topic {topic} ({len(topic_metadata.partitions)} partitions)")
+    return ok
+
+
+class DeliveryPoller(threading.Thread):
+    """
+    Background thread that serves the producer delivery callbacks.
+
+    With the poller running, request handlers only need to queue messages
+    with `produce()`; delivery results are reported through the callbacks.
+    """
+
+    def __init__(self, interval: float = KAFKA_POLL_INTERVAL_S):
+        super().__init__(name="kafka-delivery-poller", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        logger = logging.getLogger("delivery_poller")
+        logger.info("Kafka delivery poller started")
+        while not self._stop_event.is_set():
+            get_producer().poll(self.interval)
+        logger.info("Kafka delivery poller stopped")
+
+    def stop(self, timeout: float | None = None):
+        self._stop_event.set()
+        self.join(timeout=timeout)
+
+
+_producer = None
+_producer_lock = threading.Lock()
+
+
+def get_producer():
+    """
+    Return the producer of the process, building it on first use.
+    """
+    global _producer
+    if _producer is None:
+        with _producer_lock:
+            if _producer is None:
+                _producer = producer_builder()
+    return _producer
+
+
+def transactions_enabled() -> bool:
+    return KAFKA_DELIVERY_SEMANTICS == "transactional"
+
+
+_transactional_producer = None
+# A producer runs one transaction at a time
+_transaction_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def transactional_producer():
+    """
+    Hold the transactional producer of the process, building it on first
+    use, for the duration of one transaction.
+    """
+    global _transactional_producer
+    with _transaction_lock:
+        if _transactional_producer is None:
+            _transactional_producer = transactional_producer_builder()
+        yield _transactional_producer
+
+
+def discard_transactional_producer():
+    """
+    Drop the transactional producer after a fatal error; the next
+    transaction builds a new one. Call it while holding the producer.
+    """
+    global _transactional_producer
+    _transactional_producer = None
+
+
+def set_producer(producer):
+    """
+    Replace the producer of the process, e.g. with a mock in benchmarks.
+    """
+    global _producer
+    with _producer_lock:
+        _producer = producer
+
+
+_delivery_poller: DeliveryPoller | None = None
+_delivery_poller_lock = threading.Lock()
+
+
+
+def start_delivery_poller() -> DeliveryPoller:
+    """
+    Start the delivery poller for the process producer, if not already running.
+    """
+    global _delivery_poller
+    if _delivery_poller is not None and _delivery_poller.is_alive():
+        return _delivery_poller
+    with _delivery_poller_lock:
+        if _delivery_poller is None or not _delivery_poller.is_alive():
+            _delivery_poller = DeliveryPoller()
+            _delivery_poller.start()
+    return _delivery_poller
+
+
+def stop_delivery_poller(timeout: float | None = None):
+    """
+    Stop the delivery poller, if running.
+    """
+    global _delivery_poller
+    with _delivery_poller_lock:
+        if _delivery_poller is not None:
+            _delivery_poller.stop(timeout=timeout)
+            _delivery_poller = None
 
 
-producer = producer_builder()
+def close_producer(timeout: float = 10):
+    """
+    Stop the delivery poller, flush the producer of the process, if built,
+    and stop refreshing the MSK auth token.
+    """
+    logger = logging.getLogger("close_producer")
+    stop_delivery_poller(timeout=timeout)
+    if _transactional_producer is not None:
+        # Waits for a running transaction before flushing
+        with _transaction_lock:
+            if _transactional_producer is not None:
+                _transactional_producer.flush(timeout)
+    if _producer is not None:
+        remaining = _producer.flush(timeout)
+        if remaining:
+            logger.error(f"{remaining} messages not delivered at shutdown")
+        else:
+            logger.info("Kafka producer flushed")
+    # The producer may need the auth token until it is flushed
+    stop_token_manager()
@@ -0,0 +1,87 @@
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+BROKER_FIELDS = ("tx", "txretries", "txerrs", "req_timeouts", "outbuf_cnt", "waitresp_cnt")
+WINDOW_FIELDS = ("rtt", "int_latency", "outbuf_latency")
+TOPIC_WINDOW_FIELDS = ("batchsize", "batchcnt")
+
+
+def _window(stats: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: stats.get(name) for name in ("avg", "p50", "p99", "max")}
+
+
+def parse_statistics(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keep the librdkafka statistics used to tune the producer.
+
+    Window values (rtt, latencies) are in microseconds, as librdkafka reports them.
+    """
+    brokers = {}
+    for name, broker in stats.get("brokers", {}).items():
+        # Bootstrap entries (nodeid -1) only exist until the metadata is known
+        if broker.get("nodeid", -1) < 0:
+            continue
+        parsed = {"nodeid": broker.get("nodeid"), "state": broker.get("state")}
+        parsed.update({field: broker.get(field) for field in BROKER_FIELDS})
+        parsed.update({field: _window(broker.get(field, {})) for field in WINDOW_FIELDS})
+        brokers[name] = parsed
+
+    topics = {}
+    for name, topic in stats.get("topics", {}).items():
+        partitions = [
+            partition
+            for partition_id, partition in topic.get("partitions", {}).items()
+            if partition_id != "-1"
+        ]
+        parsed = {field: _window(topic.get(field, {})) for field in TOPIC_WINDOW_FIELDS}
+        parsed["msgq_cnt"] = sum(p.get("msgq_cnt", 0) for p in partitions)
+        parsed["xmit_msgq_cnt"] = sum(p.get("xmit_msgq_cnt", 0) for p in partitions)
+        parsed["txmsgs"] = sum(p.get("txmsgs", 0) for p in partitions)
+        topics[name] = parsed
+
+    return {
+        "name": stats.get("name"),
+        "ts": stats.get("ts"),
+        "received_at": time.time(),
+        "producer": {
+            field: stats.get(field)
+            for field in ("msg_cnt", "msg_size", "msg_max", "msg_size_max", "tx", "txmsgs", "txmsg_bytes")
+        },
+        "brokers": brokers,
+        "topics": topics,
+    }
+
+
+class ProducerStatistics:
+    """
+    Latest librdkafka statistics of the producer, updated by `stats_cb`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest: Optional[Dict[str, Any]] = None
+
+    def update(self, stats_json: str):
+        try:
+            parsed = parse_statistics(json.loads(stats_json))
+        except (ValueError, AttributeError, TypeError) as e:
+            logging.getLogger("producer_statistics").warning(
+                f"Could not parse librdkafka statistics: {e}"
+            )
+            return
+        with self._lock:
+            self._latest = parsed
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._latest
+
+
+producer_statistics = ProducerStatistics()
+
+
+def stats_cb(stats_json: str):
+    producer_statistics.update(stats_json)
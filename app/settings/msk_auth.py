@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from typing import Optional, Tuple
+
+from app.settings.variables import (
+    KAFKA_MSK_AWS_REGION,
+    KAFKA_MSK_TOKEN_REFRESH_FRACTION,
+    MSK_AUTH_DEBUG_CREDS,
+)
+
+# Delay before retrying a failed refresh while the current token is still valid
+REFRESH_RETRY_S = 5.0
+
+
+class MskTokenManager:
+    """
+    Cache the MSK IAM auth token and refresh it in the background.
+
+    The token is renewed once `refresh_fraction` of its lifetime has
+    elapsed, so `oauth_cb` only returns the cached token and never resolves
+    AWS credentials on the librdkafka callback thread.
+    """
+
+    def __init__(
+        self,
+        region: str,
+        refresh_fraction: float = KAFKA_MSK_TOKEN_REFRESH_FRACTION,
+        debug_creds: bool = MSK_AUTH_DEBUG_CREDS,
+    ):
+        self.region = region
+        self.refresh_fraction = refresh_fraction
+        self.debug_creds = debug_creds
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        # Expiry as a UNIX timestamp in seconds
+        self._expiry: float = 0.0
+        self._refresh_at: float = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def expiry(self) -> float:
+        return self._expiry
+
+    def _generate(self) -> Tuple[str, float]:
+        # Pulls in boto3, so it is only imported when MSK is used
+        from aws_msk_iam_sasl_signer import MSKAuthTokenProvider
+
+        logger = logging.getLogger("msk_token_manager")
+        start = time.time()
+        token, expiry_ms = MSKAuthTokenProvider.generate_auth_token(
+            self.region, aws_debug_creds=self.debug_creds
+        )
+        expiry = expiry_ms / 1000
+        with self._lock:
+            self._token = token
+            self._expiry = expiry
+            self._refresh_at = start + (expiry - start) * self.refresh_fraction
+        logger.info(f"MSK auth token refreshed, expires in {expiry - time.time():.0f}s")
+        return token, expiry
+
+    def token(self) -> Tuple[str, float]:
+        """
+        Return the (token, expiry in seconds) pair, generating it only when
+        there is no valid cached token.
+        """
+        with self._lock:
+            if self._token is not None and time.time() < self._expiry:
+                token, expiry = self._token, self._expiry
+            else:
+                token = None
+        if token is None:
+            token, expiry = self._generate()
+        self.start()
+        return token, expiry
+
+    def _run(self):
+        logger = logging.getLogger("msk_token_manager")
+        while not self._stop_event.is_set():
+            delay = self._refresh_at - time.time()
+            if delay > 0:
+                self._stop_event.wait(delay)
+                continue
+            try:
+                self._generate()
+            except Exception as e:
+                logger.error(
+                    f"Failed to refresh the MSK auth token, retrying in {REFRESH_RETRY_S}s: {e}"
+                )
+                self._stop_event.wait(REFRESH_RETRY_S)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="msk-token-refresh", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_token_manager: Optional[MskTokenManager] = None
+_token_manager_lock = threading.Lock()
+
+
+
+def get_token_manager() -> Optional[MskTokenManager]:
+    """
+    Return the token manager of the process, or None when MSK is not used.
+    """
+    global _token_manager
+    if KAFKA_MSK_AWS_REGION is None:
+        return None
+    if _token_manager is None:
+        with _token_manager_lock:
+            if _token_manager is None:
+                _token_manager = MskTokenManager(KAFKA_MSK_AWS_REGION)
+    return _token_manager
+
+
+def stop_token_manager():
+    """
+    Stop refreshing the auth token, if the token manager was built.
+    """
+    if _token_manager is not None:
+        _token_manager.stop()
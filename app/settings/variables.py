@@ -10,3 +10,55 @@ KAFKA_MSK_AWS_REGION = KAFKA_MSK_ARN.split(":")[3] if KAFKA_MSK_ARN is not None
 SCHEMA_REGISTRY_URL = os.getenv("SCHEMA_REGISTRY_URL", None)
 LOGGING_LEVEL = os.getenv("LOGGING_LEVEL", "INFO").upper()
 ENVIRONMENT = os.getenv("ENVIRONMENT", "DEV").upper()
+KAFKA_PUBLISH_MODE = os.getenv("KAFKA_PUBLISH_MODE", "sync").lower()
+KAFKA_DELIVERY_TIMEOUT_S = float(os.getenv("KAFKA_DELIVERY_TIMEOUT_S", "10"))
+KAFKA_POLL_INTERVAL_S = float(os.getenv("KAFKA_POLL_INTERVAL_S", "0.1"))
+AVRO_SCHEMA_DIR = os.getenv("AVRO_SCHEMA_DIR", None)
+AVRO_ENCODER = os.getenv("AVRO_ENCODER", "fastavro").lower()
+KAFKA_JSON_SERIALIZER = os.getenv("KAFKA_JSON_SERIALIZER", "stdlib").lower()
+KAFKA_STATISTICS_INTERVAL_MS = int(os.getenv("KAFKA_STATISTICS_INTERVAL_MS", "0"))
+KAFKA_PRODUCER_PROFILE = os.getenv("KAFKA_PRODUCER_PROFILE", "default").lower()
+# Any other KAFKA_PRODUCER_<NAME> variable is passed to librdkafka as <name>,
+# e.g. KAFKA_PRODUCER_LINGER_MS=10 sets linger.ms=10
+KAFKA_PRODUCER_CONFIG = {
+    name[len("KAFKA_PRODUCER_"):].lower().replace("_", "."): value
+    for name, value in os.environ.items()
+    if name.startswith("KAFKA_PRODUCER_") and name != "KAFKA_PRODUCER_PROFILE"
+}
+KAFKA_SPOOL_DIR = os.getenv("KAFKA_SPOOL_DIR") or None
+KAFKA_SPOOL_SEGMENT_BYTES = int(os.getenv("KAFKA_SPOOL_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+KAFKA_SPOOL_MAX_BYTES = int(os.getenv("KAFKA_SPOOL_MAX_BYTES", str(1024 * 1024 * 1024)))
+KAFKA_SPOOL_MAX_IN_FLIGHT = int(os.getenv("KAFKA_SPOOL_MAX_IN_FLIGHT", "10000"))
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# 0 starts one worker process per available CPU
+API_WORKERS = int(os.getenv("API_WORKERS", "0"))
+KAFKA_STARTUP_METADATA_TIMEOUT_S = float(os.getenv("KAFKA_STARTUP_METADATA_TIMEOUT_S", "10"))
+KAFKA_SHUTDOWN_DRAIN_TIMEOUT_S = float(os.getenv("KAFKA_SHUTDOWN_DRAIN_TIMEOUT_S", "25"))
+READINESS_PROBE_INTERVAL_S = float(os.getenv("READINESS_PROBE_INTERVAL_S", "10"))
+READINESS_PROBE_TIMEOUT_S = float(os.getenv("READINESS_PROBE_TIMEOUT_S", "5"))
+# Fraction of the producer queue or spool capacity above which the API is not ready
+READINESS_QUEUE_SATURATION = float(os.getenv("READINESS_QUEUE_SATURATION", "0.9"))
+# Admission control: 0 disables a limit
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "1000"))
+ADMISSION_MAX_IN_FLIGHT_PER_DAG = int(os.getenv("ADMISSION_MAX_IN_FLIGHT_PER_DAG", "0"))
+ADMISSION_MAX_QUEUE_FILL = float(os.getenv("ADMISSION_MAX_QUEUE_FILL", "0.8"))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", "1"))
+# Validate request bodies straight from the raw bytes with pydantic-core
+API_FAST_VALIDATION = os.getenv("API_FAST_VALIDATION", "false").lower() == "true"
+# Deduplication of repeated events: 0 entries disables it
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "100000"))
+DEDUP_TTL_S = float(os.getenv("DEDUP_TTL_S", "300"))
+# at_least_once, idempotent, or transactional (idempotent, and batches in transactions)
+KAFKA_DELIVERY_SEMANTICS = os.getenv("KAFKA_DELIVERY_SEMANTICS", "at_least_once").lower()
+KAFKA_TRANSACTIONAL_ID_PREFIX = os.getenv("KAFKA_TRANSACTIONAL_ID_PREFIX", "api-airflow-kafka-log")
+# Fraction of the MSK auth token lifetime after which it is refreshed
+KAFKA_MSK_TOKEN_REFRESH_FRACTION = float(os.getenv("KAFKA_MSK_TOKEN_REFRESH_FRACTION", "0.8"))
+# Log the AWS credentials used for the MSK auth token, for debugging only
+MSK_AUTH_DEBUG_CREDS = os.getenv("MSK_AUTH_DEBUG_CREDS", "false").lower() == "true"
+# Maximum size of a batch request body once decompressed
+API_MAX_DECODED_BODY_BYTES = int(os.getenv("API_MAX_DECODED_BODY_BYTES", str(64 * 1024 * 1024)))
+# Streaming endpoints: events published per chunk, errors reported and line size
+API_STREAM_CHUNK_SIZE = int(os.getenv("API_STREAM_CHUNK_SIZE", "500"))
+API_STREAM_MAX_ERRORS = int(os.getenv("API_STREAM_MAX_ERRORS", "100"))
+API_STREAM_MAX_LINE_BYTES = int(os.getenv("API_STREAM_MAX_LINE_BYTES", str(1024 * 1024)))
@@ -0,0 +1,585 @@
+"""
+Durable local spool for events, drained to Kafka in the background.
+
+Accepted events are appended to segment files and fsynced in groups before
+the request is answered; a drainer thread produces them to Kafka and
+deletes a segment once every record in it is delivered. The position of the
+first undelivered record is checkpointed, so a restart resumes from there
+(delivery is at-least-once).
+
+Each process owns a `worker-<n>` directory under `KAFKA_SPOOL_DIR`, held
+with an exclusive flock; a restarted worker takes over a free directory and
+drains what its predecessor left. Free directories still holding records,
+e.g. after a restart with fewer workers, are drained by the first worker
+that finds them and released once empty.
+
+Record layout: length (4 bytes) | crc32 (4 bytes) | payload, where payload
+is topic, key, value and headers, each length-prefixed.
+"""
+import fcntl
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.settings.kafka import get_producer
+from app.settings.variables import (
+    KAFKA_SPOOL_DIR,
+    KAFKA_SPOOL_MAX_BYTES,
+    KAFKA_SPOOL_MAX_IN_FLIGHT,
+    KAFKA_SPOOL_SEGMENT_BYTES,
+)
+
+RECORD_HEADER = struct.Struct(">II")
+SHORT = struct.Struct(">H")
+INT = struct.Struct(">i")
+SEGMENT_SUFFIX = ".seg"
+CHECKPOINT_FILE = "checkpoint"
+LOCK_FILE = "lock"
+
+# (topic, key, value, headers)
+SpoolRecord = Tuple[str, Optional[bytes], bytes, Dict[str, bytes]]
+# (segment id, offset in segment)
+Position = Tuple[int, int]
+
+
+class SpoolFullError(Exception):
+    pass
+
+
+class SpoolLockedError(Exception):
+    pass
+
+
+def _as_bytes(value) -> bytes:
+    return value.encode() if isinstance(value, str) else bytes(value)
+
+
+def encode_record(topic: str, key, value, headers: Optional[dict]) -> bytes:
+    topic_bytes = topic.encode()
+    parts = [SHORT.pack(len(topic_bytes)), topic_bytes]
+    if key is None:
+        parts.append(INT.pack(-1))
+    else:
+        key = _as_bytes(key)
+        parts += [INT.pack(len(key)), key]
+    value = _as_bytes(value)
+    parts += [INT.pack(len(value)), value]
+    headers = headers or {}
+    parts.append(SHORT.pack(len(headers)))
+    for name, header_value in headers.items():
+        name_bytes = name.encode()
+        header_value = _as_bytes(header_value)
+        parts += [SHORT.pack(len(name_bytes)), name_bytes, INT.pack(len(header_value)), header_value]
+    payload = b"".join(parts)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_payload(payload: bytes) -> SpoolRecord:
+    offset = 0
+
+    def read(struct_type):
+        nonlocal offset
+        (value,) = struct_type.unpack_from(payload, offset)
+        offset += struct_type.size
+        return value
+
+    def read_bytes(length):
+        nonlocal offset
+        data = payload[offset:offset + length]
+        offset += length
+        return data
+
+    topic = read_bytes(read(SHORT)).decode()
+    key_length = read(INT)
+    key = read_bytes(key_length) if key_length >= 0 else None
+    value = read_bytes(read(INT))
+    headers = {}
+    for _ in range(read(SHORT)):
+        name = read_bytes(read(SHORT)).decode()
+        headers[name] = read_bytes(read(INT))
+    return topic, key, value, headers
+
+
+def segment_path(directory: str, segment_id: int) -> str:
+    return os.path.join(directory, f"{segment_id:020d}{SEGMENT_SUFFIX}")
+
+
+def list_segments(directory: str) -> List[int]:
+    return sorted(
+        int(name[: -len(SEGMENT_SUFFIX)])
+        for name in os.listdir(directory)
+        if name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def read_records(path: str, start: int, end: int) -> Iterator[Tuple[int, SpoolRecord]]:
+    """
+    Yield (end offset, record) for the records between `start` and `end`.
+
+    Stops at the first truncated or corrupted record, which can only be the
+    torn tail of a segment written before a crash.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        while position + RECORD_HEADER.size <= end:
+            length, crc = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            if position + RECORD_HEADER.size + length > end:
+                return
+            payload = f.read(length)
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                logging.getLogger("spool").error(
+                    f"Corrupted record in {path} at offset {position}, skipping the rest of the segment"
+                )
+                return
+            position += RECORD_HEADER.size + length
+            yield position, decode_payload(payload)
+
+
+class Spool:
+    """
+    Append-only segmented spool with group-committed fsyncs.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = KAFKA_SPOOL_SEGMENT_BYTES,
+        max_bytes: int = KAFKA_SPOOL_MAX_BYTES,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = self._lock_directory()
+        # _lock guards the active segment and the synced position; _sync_lock
+        # only elects the caller that runs the next fsync
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        existing = list_segments(directory)
+        self._size = sum(os.path.getsize(segment_path(directory, s)) for s in existing)
+        # Never append to a segment written by a previous process: its tail may be torn
+        self._segment_id = (existing[-1] + 1) if existing else 0
+        self._file = self._open_segment()
+        self._synced: Position = (self._segment_id, 0)
+
+    def _lock_directory(self) -> int:
+        fd = os.open(os.path.join(self.directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise SpoolLockedError(f"Spool directory {self.directory} is used by another process")
+        return fd
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def synced(self) -> Position:
+        return self._synced
+
+    def append(self, records: List[bytes]) -> Position:
+        """
+        Append encoded records and return the position after the last one.
+
+        The records are not durable until `sync()` covers that position.
+        """
+        data = b"".join(records)
+        with self._lock:
+            if self._size + len(data) > self.max_bytes:
+                raise SpoolFullError(f"Spool is full ({self._size} bytes)")
+            if self._file.tell() > 0 and self._file.tell() + len(data) > self.segment_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._size += len(data)
+            return self._segment_id, self._file.tell()
+
+    def _open_segment(self):
+        segment = open(segment_path(self.directory, self._segment_id), "ab")
+        # Make the new file entry itself durable
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return segment
+
+    def _rotate(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        sealed = (self._segment_id, self._file.tell())
+        self._file.close()
+        self._segment_id += 1
+        self._file = self._open_segment()
+        if sealed > self._synced:
+            self._synced = sealed
+        self._appended.notify_all()
+
+    def sync(self, position: Position):
+        """
+        Make every record up to `position` durable.
+
+        Concurrent callers share fsyncs: the first one syncs everything
+        appended so far and the others return as soon as they are covered.
+        """
+        with self._sync_lock:
+            if position <= self._synced:
+                return
+            with self._lock:
+                self._file.flush()
+                target = (self._segment_id, self._file.tell())
+                fd = os.dup(self._file.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self._appended:
+                self._synced = max(self._synced, target)
+                self._appended.notify_all()
+
+    def wait_for_sync(self, seen: Position, timeout: float):
+        """
+        Wait until records past the `seen` synced position are durable, or
+        `timeout` expires.
+        """
+        with self._appended:
+            if self._synced == seen:
+                self._appended.wait(timeout)
+
+    def remove_segment(self, segment_id: int):
+        path = segment_path(self.directory, segment_id)
+        size = os.path.getsize(path)
+        os.remove(path)
+        with self._lock:
+            self._size -= size
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        os.close(self._lock_fd)
+
+
+class SpoolDrainer(threading.Thread):
+    """
+    Produce spooled records to Kafka, in order, from the checkpoint onwards.
+
+    At most `max_in_flight` records are waiting for their delivery report at
+    any time, so memory stays bounded whatever the spool size. On a delivery
+    failure the drainer waits and replays from the first undelivered record.
+    With `close_when_drained`, for a spool nothing appends to, the drainer
+    closes the spool and stops once every record is delivered.
+    """
+
+    def __init__(
+        self,
+        spool: Spool,
+        max_in_flight: int = KAFKA_SPOOL_MAX_IN_FLIGHT,
+        retry_backoff_s: float = 5.0,
+        checkpoint_interval_s: float = 1.0,
+        close_when_drained: bool = False,
+    ):
+        super().__init__(name="kafka-spool-drainer", daemon=True)
+        self.spool = spool
+        self.close_when_drained = close_when_drained
+        self.max_in_flight = max_in_flight
+        self.retry_backoff_s = retry_backoff_s
+        self.checkpoint_interval_s = checkpoint_interval_s
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # (segment id, end offset, delivered) of the records waiting for a report
+        self._in_flight: deque = deque()
+        self._failed = False
+        self._checkpoint: Position = self._read_checkpoint()
+        self._checkpoint_written: Position = self._checkpoint
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.spool.directory, CHECKPOINT_FILE)
+
+    @property
+    def checkpoint(self) -> Position:
+        return self._checkpoint
+
+    def _read_checkpoint(self) -> Position:
+        try:
+            with open(self.checkpoint_path) as f:
+                segment_id, offset = f.read().split()
+                return int(segment_id), int(offset)
+        except (FileNotFoundError, ValueError):
+            segments = list_segments(self.spool.directory)
+            return (segments[0] if segments else 0), 0
+
+    def _advance_checkpoint(self):
+        # A sealed segment is never appended to again: once delivered up to
+        # its end, the checkpoint moves on to the next one
+        active_segment = self.spool.synced[0]
+        with self._lock:
+            segment_id, offset = self._checkpoint
+            for candidate in list_segments(self.spool.directory):
+                if candidate < segment_id:
+                    continue
+                if candidate >= active_segment:
+                    break
+                if candidate == segment_id and offset < os.path.getsize(segment_path(self.spool.directory, candidate)):
+                    break
+                segment_id, offset = candidate + 1, 0
+            self._checkpoint = (segment_id, offset)
+
+    def _write_checkpoint(self):
+        self._advance_checkpoint()
+        checkpoint = self._checkpoint
+        if checkpoint == self._checkpoint_written:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{checkpoint[0]} {checkpoint[1]}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        self._checkpoint_written = checkpoint
+        for segment_id in list_segments(self.spool.directory):
+            if segment_id >= checkpoint[0]:
+                break
+            self.spool.remove_segment(segment_id)
+
+    def _delivery_callback(self, entry: list):
+        def callback(err, msg):
+            with self._lock:
+                if err is not None:
+                    logging.getLogger("spool").error(f"Spooled message delivery failed: {err}")
+                    self._failed = True
+                entry[2] = err is None
+                while self._in_flight and self._in_flight[0][2]:
+                    segment_id, offset, _ = self._in_flight.popleft()
+                    self._checkpoint = (segment_id, offset)
+
+        return callback
+
+    def _records(self, position: Position) -> Iterator[Tuple[Position, SpoolRecord]]:
+        segment_id, offset = position
+        for candidate in list_segments(self.spool.directory):
+            if candidate < segment_id:
+                continue
+            if candidate > segment_id:
+                offset = 0
+            synced_segment, synced_offset = self.spool.synced
+            if candidate > synced_segment:
+                return
+            path = segment_path(self.spool.directory, candidate)
+            end = synced_offset if candidate == synced_segment else os.path.getsize(path)
+            for end_offset, record in read_records(path, offset, end):
+                yield (candidate, end_offset), record
+            if candidate == synced_segment:
+                return
+
+    def _replay(self) -> Position:
+        producer = get_producer()
+        producer.flush(timeout=30)
+        with self._lock:
+            self._in_flight.clear()
+            self._failed = False
+            return self._checkpoint
+
+    def run(self):
+        logger = logging.getLogger("spool")
+        logger.info(f"Spool drainer started from {self._checkpoint}")
+        producer = get_producer()
+        position = self._checkpoint
+        last_checkpoint = time.monotonic()
+        while not self._stop_event.is_set():
+            produced = 0
+            seen_synced = self.spool.synced
+            for (segment_id, end_offset), (topic, key, value, headers) in self._records(position):
+                if self._stop_event.is_set() or self._failed:
+                    break
+                while (
+                    len(self._in_flight) >= self.max_in_flight
+                    and not self._failed
+                    and not self._stop_event.is_set()
+                ):
+                    producer.poll(0.1)
+                if self._stop_event.is_set():
+                    break
+                entry = [segment_id, end_offset, False]
+                try:
+                    with self._lock:
+                        self._in_flight.append(entry)
+                    producer.produce(
+                        topic=topic,
+                        value=value,
+                        key=key,
+                        headers=headers,
+                        callback=self._delivery_callback(entry),
+                    )
+                except BufferError:
+                    with self._lock:
+                        self._in_flight.remove(entry)
+                    producer.poll(0.1)
+                    break
+                position = (segment_id, end_offset)
+                produced += 1
+            producer.poll(0)
+            if self._failed:
+                logger.warning(f"Replaying spool from {self._checkpoint} in {self.retry_backoff_s}s")
+                if self._stop_event.wait(self.retry_backoff_s):
+                    break
+                position = self._replay()
+            elif not produced:
+                if self.close_when_drained and not self._in_flight:
+                    break
+                self.spool.wait_for_sync(seen_synced, timeout=0.1)
+            if time.monotonic() - last_checkpoint >= self.checkpoint_interval_s:
+                self._write_checkpoint()
+                last_checkpoint = time.monotonic()
+        self._write_checkpoint()
+        if self.close_when_drained and not self._stop_event.is_set():
+            self.spool.close()
+            logger.info(f"Spool directory {self.spool.directory} drained and released")
+        logger.info("Spool drainer stopped")
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop draining and write the checkpoint, unless the thread is still
+        running after `timeout`: it then still owns the checkpoint.
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else 10)
+        self._stop_event.set()
+        self.join(timeout=timeout)
+        if self.spool.closed:
+            return
+        if self.is_alive():
+            logging.getLogger("spool").error(
+                f"Spool drainer did not stop within {timeout}s, checkpoint left at {self._checkpoint_written}"
+            )
+            return
+        get_producer().flush(max(0.0, deadline - time.monotonic()))
+        self._write_checkpoint()
+
+
+_spool: Optional[Spool] = None
+_spool_drainer: Optional[SpoolDrainer] = None
+# Drainers of the free directories left with records by other workers
+_orphan_drainers: List[SpoolDrainer] = []
+_spool_lock = threading.Lock()
+
+
+
+def spool_enabled() -> bool:
+    return KAFKA_SPOOL_DIR is not None
+
+
+def open_worker_spool(root: str) -> Spool:
+    """
+    Open the spool of the first `worker-<n>` directory under `root` not
+    held by another process.
+    """
+    index = 0
+    while True:
+        try:
+            spool = Spool(os.path.join(root, f"worker-{index}"))
+        except SpoolLockedError:
+            index += 1
+            continue
+        logging.getLogger("spool").info(f"Using spool directory {spool.directory}")
+        return spool
+
+
+def open_orphan_spools(root: str) -> List[Spool]:
+    """
+    Open the `worker-<n>` directories under `root` that still hold records
+    and are not held by any process, e.g. after a restart with fewer
+    workers.
+    """
+    logger = logging.getLogger("spool")
+    spools = []
+    for name in sorted(os.listdir(root)):
+        directory = os.path.join(root, name)
+        if not name.startswith("worker-") or not os.path.isdir(directory):
+            continue
+        if not any(
+            os.path.getsize(segment_path(directory, segment_id))
+            for segment_id in list_segments(directory)
+        ):
+            continue
+        try:
+            spool = Spool(directory)
+        except SpoolLockedError:
+            continue
+        logger.warning(f"Draining spool directory {directory} left by another worker")
+        spools.append(spool)
+    return spools
+
+
+def get_spool() -> Spool:
+    """
+    Return the spool of the process, opening it and starting its drainer on
+    first use.
+    """
+    global _spool, _spool_drainer
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                spool = open_worker_spool(KAFKA_SPOOL_DIR)
+                _spool_drainer = SpoolDrainer(spool)
+                _spool_drainer.start()
+                for orphan in open_orphan_spools(KAFKA_SPOOL_DIR):
+                    drainer = SpoolDrainer(orphan, close_when_drained=True)
+                    drainer.start()
+                    _orphan_drainers.append(drainer)
+                _spool = spool
+    return _spool
+
+
+def get_spool_drainer() -> Optional[SpoolDrainer]:
+    return _spool_drainer
+
+
+def spool_records(records: List[SpoolRecord]):
+    """
+    Durably spool (topic, key, value, headers) records.
+
+    Returns once the records are fsynced; raises SpoolFullError when the
+    spool reached `KAFKA_SPOOL_MAX_BYTES`.
+    """
+    spool = get_spool()
+    position = spool.append([encode_record(*record) for record in records])
+    spool.sync(position)
+
+
+def close_spool(timeout: Optional[float] = None):
+    """
+    Stop the drainers, checkpoint and close the spools.
+    """
+    global _spool, _spool_drainer
+    with _spool_lock:
+        for drainer in _orphan_drainers:
+            drainer.stop(timeout=timeout)
+            if not drainer.is_alive():
+                drainer.spool.close()
+        _orphan_drainers.clear()
+        if _spool_drainer is not None:
+            _spool_drainer.stop(timeout=timeout)
+            if _spool_drainer.is_alive():
+                # Closing the spool under a running drainer would race it; the
+                # directory lock is released when the process exits
+                return
+            _spool_drainer = None
+        if _spool is not None:
+            _spool.close()
+            _spool = None
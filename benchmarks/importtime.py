@@ -0,0 +1,161 @@
+"""
+Cold start profile of the API process.
+
+Imports `app.main` in fresh interpreters with `python -X importtime` and
+reports the slowest modules, by cumulative and by self time. With
+`--first-request`, also measures the time from interpreter start to the
+first answered request, with the lifespan warm-up run against a mock
+producer.
+
+Examples:
+
+    # Top 20 modules, median of 5 runs
+    python -m benchmarks.importtime
+
+    # Avro mode, with the time to the first request
+    python -m benchmarks.importtime --env SCHEMA_REGISTRY_URL=http://localhost:8081 --first-request
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+FIRST_REQUEST_SCRIPT = """
+import asyncio, time
+import httpx
+from app.main import app
+from app.settings.kafka import set_producer
+from benchmarks.mocks import MockProducer
+
+set_producer(MockProducer(latency_s=0))
+
+async def first_request():
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            response = await client.get("/health")
+            print(time.time(), response.status_code, flush=True)
+
+asyncio.run(first_request())
+"""
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Profile the imports of the API process",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to average over")
+    parser.add_argument("--top", type=int, default=20, help="Modules to report")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Extra environment variable, repeatable")
+    parser.add_argument("--first-request", action="store_true", help="Also measure the time to the first request")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def environment(args: argparse.Namespace) -> Dict[str, str]:
+    env = dict(os.environ)
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    return env
+
+
+def import_times(module: str, env: Dict[str, str]) -> Dict[str, Tuple[int, int]]:
+    """
+    Import `module` in a fresh interpreter and return the (self, cumulative)
+    import time of every module, in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def first_request_seconds(env: Dict[str, str]) -> float:
+    """
+    Seconds from the start of a fresh interpreter to the first response.
+    """
+    start = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST_SCRIPT],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    answered_at, status = result.stdout.split()[-2:]
+    if status != "200":
+        raise RuntimeError(f"First request answered with {status}")
+    return float(answered_at) - start
+
+
+def report(args: argparse.Namespace) -> Dict[str, object]:
+    env = environment(args)
+    runs = [import_times(args.module, env) for _ in range(args.runs)]
+    modules = set().union(*runs)
+    medians = {
+        name: (
+            statistics.median(run.get(name, (0, 0))[0] for run in runs),
+            statistics.median(run.get(name, (0, 0))[1] for run in runs),
+        )
+        for name in modules
+    }
+    by_cumulative = sorted(medians.items(), key=lambda item: item[1][1], reverse=True)
+    by_self = sorted(medians.items(), key=lambda item: item[1][0], reverse=True)
+    result: Dict[str, object] = {
+        "module": args.module,
+        "runs": args.runs,
+        "modules_imported": len(modules),
+        "import_ms": medians.get(args.module, (0, 0))[1] / 1000,
+        "top_cumulative_ms": [(name, times[1] / 1000) for name, times in by_cumulative[: args.top]],
+        "top_self_ms": [(name, times[0] / 1000) for name, times in by_self[: args.top]],
+    }
+    if args.first_request:
+        result["first_request_s"] = statistics.median(
+            first_request_seconds(env) for _ in range(args.runs)
+        )
+    return result
+
+
+def print_table(title: str, rows: List[Tuple[str, float]]):
+    print(f"\n{title}")
+    for name, ms in rows:
+        print(f"  {ms:9.1f} ms  {name}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = report(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(
+        f"import {result['module']}: {result['import_ms']:.1f} ms, "
+        f"{result['modules_imported']} modules (median of {result['runs']} runs)"
+    )
+    if "first_request_s" in result:
+        print(f"time to first request: {result['first_request_s'] * 1000:.1f} ms")
+    print_table("Slowest modules, cumulative", result["top_cumulative_ms"])
+    print_table("Slowest modules, self", result["top_self_ms"])
+
+
+if __name__ == "__main__":
+    main()
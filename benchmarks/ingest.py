@@ -0,0 +1,243 @@
+"""
+Load generator and latency benchmark for the ingestion API.
+
+Drives `app.main:app` in-process (with a mock or a real Kafka producer) or a
+running API over HTTP, with v2/v3 DAG run and task instance payloads, and
+reports latency percentiles, throughput and CPU time per event.
+
+Examples:
+
+    # In-process, mock Kafka, JSON mode
+    python -m benchmarks.ingest --requests 20000 --concurrency 64
+
+    # In-process, mock Kafka and Schema Registry, Avro mode, async publish
+    python -m benchmarks.ingest --format avro --publish-mode async
+
+    # Raw-body validation of the v3 task instance events
+    python -m benchmarks.ingest --airflow-version v3 --event task_instance --fast-validation
+
+    # In-process against the local broker of docker-compose.dev.yaml
+    python -m benchmarks.ingest --kafka real
+
+    # Running API; CPU is read from the server process
+    python -m benchmarks.ingest --target http://localhost:8000 --server-pid 1234
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.payloads import PAYLOADS
+
+EVENT_PATHS = {
+    "dag_run": "/api/v1/airflow_{version}/events/dag_run",
+    "task_instance": "/api/v1/airflow_{version}/events/task_instance",
+}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ingestion API",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--target", default="asgi", help="'asgi' to run the app in-process, or the base URL of a running API")
+    parser.add_argument("--kafka", choices=("mock", "real"), default="mock", help="Producer used in-process")
+    parser.add_argument("--format", choices=("json", "avro"), default="json", help="Message format used in-process")
+    parser.add_argument("--publish-mode", choices=("sync", "async"), default=None, help="KAFKA_PUBLISH_MODE used in-process")
+    parser.add_argument("--fast-validation", action="store_true", help="Set API_FAST_VALIDATION in-process")
+    parser.add_argument("--mock-latency-ms", type=float, default=1.0, help="Simulated broker latency of the mock producer")
+    parser.add_argument("--airflow-version", choices=("v2", "v3", "all"), default="all")
+    parser.add_argument("--event", choices=("dag_run", "task_instance", "all"), default="all")
+    parser.add_argument("--requests", type=int, default=5000, help="Number of measured requests")
+    parser.add_argument("--warmup", type=int, default=200, help="Number of requests before measuring")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=0, help="Events per request on the /batch endpoints; 0 posts single events")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID of the API process, to report its CPU time")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace):
+    """
+    Set the API environment; must run before `app` is imported.
+    """
+    if args.format == "avro":
+        os.environ.setdefault("SCHEMA_REGISTRY_URL", "mock://" if args.kafka == "mock" else "http://localhost:8081")
+    else:
+        os.environ.pop("SCHEMA_REGISTRY_URL", None)
+    if args.publish_mode is not None:
+        os.environ["KAFKA_PUBLISH_MODE"] = args.publish_mode
+    if args.fast_validation:
+        os.environ["API_FAST_VALIDATION"] = "true"
+    os.environ.setdefault("LOGGING_LEVEL", "WARNING")
+
+
+def install_mocks(args: argparse.Namespace):
+    from benchmarks.mocks import MockProducer, MockSchemaRegistryClient
+    from app.api.controllers.avro import set_schema_registry_client
+    from app.settings.kafka import set_producer
+
+    set_producer(MockProducer(latency_s=args.mock_latency_ms / 1000))
+    if args.format == "avro":
+        set_schema_registry_client(MockSchemaRegistryClient())
+
+
+def process_cpu_seconds(pid: Optional[int]) -> float:
+    """
+    User + system CPU seconds of `pid`, or of this process when None.
+    """
+    if pid is None:
+        return time.process_time()
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def build_requests(args: argparse.Namespace, count: int, rng: random.Random) -> List[tuple]:
+    versions = ("v2", "v3") if args.airflow_version == "all" else (args.airflow_version,)
+    events = ("dag_run", "task_instance") if args.event == "all" else (args.event,)
+    kinds = [(version, event) for version in versions for event in events]
+    requests = []
+    for _ in range(count):
+        version, event = rng.choice(kinds)
+        path = EVENT_PATHS[event].format(version=version)
+        if args.batch_size:
+            body = [PAYLOADS[(version, event)](rng) for _ in range(args.batch_size)]
+            requests.append((f"{path}/batch", body))
+        else:
+            requests.append((path, PAYLOADS[(version, event)](rng)))
+    return requests
+
+
+async def run_load(client, requests: List[tuple], concurrency: int) -> Dict[str, list]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+
+    async def worker():
+        while True:
+            try:
+                path, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latencies": latencies, "errors": errors}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, object]:
+    import httpx
+
+    rng = random.Random(args.seed)
+    if args.target == "asgi":
+        configure_environment(args)
+        from app.main import app
+
+        if args.kafka == "mock":
+            install_mocks(args)
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://benchmark")
+        lifespan = app.router.lifespan_context(app)
+        server_pid = None
+    else:
+        client = httpx.AsyncClient(
+            base_url=args.target,
+            limits=httpx.Limits(max_connections=args.concurrency),
+            timeout=30,
+        )
+        lifespan = None
+        server_pid = args.server_pid
+
+    try:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        await run_load(client, build_requests(args, args.warmup, rng), args.concurrency)
+        requests = build_requests(args, args.requests, rng)
+        cpu_start = process_cpu_seconds(server_pid) if args.target == "asgi" or server_pid else None
+        wall_start = time.perf_counter()
+        result = await run_load(client, requests, args.concurrency)
+        wall = time.perf_counter() - wall_start
+        cpu = process_cpu_seconds(server_pid) - cpu_start if cpu_start is not None else None
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        await client.aclose()
+
+    latencies = result["latencies"]
+    events = len(requests) * (args.batch_size or 1)
+    return {
+        "target": args.target,
+        "kafka": args.kafka if args.target == "asgi" else None,
+        "format": args.format if args.target == "asgi" else None,
+        "publish_mode": os.environ.get("KAFKA_PUBLISH_MODE", "sync") if args.target == "asgi" else None,
+        "fast_validation": args.fast_validation if args.target == "asgi" else None,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "requests": len(requests),
+        "events": events,
+        "errors": result["errors"],
+        "wall_s": wall,
+        "requests_per_s": len(requests) / wall,
+        "events_per_s": events / wall,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+            "mean": statistics.fmean(latencies) * 1000,
+        },
+        # In-process runs include the load generator itself in the CPU time
+        "cpu_us_per_event": cpu / events * 1e6 if cpu is not None else None,
+    }
+
+
+def print_report(report: Dict[str, object]):
+    latency = report["latency_ms"]
+    print(f"target          {report['target']} (kafka={report['kafka']}, format={report['format']}, publish_mode={report['publish_mode']}, fast_validation={report['fast_validation']})")
+    print(f"requests        {report['requests']} ({report['events']} events), concurrency {report['concurrency']}")
+    print(f"errors          {report['errors'] or 'none'}")
+    print(f"throughput      {report['requests_per_s']:.0f} req/s, {report['events_per_s']:.0f} events/s")
+    print(
+        f"latency (ms)    p50 {latency['p50']:.2f}  p90 {latency['p90']:.2f}  "
+        f"p99 {latency['p99']:.2f}  max {latency['max']:.2f}"
+    )
+    if report["cpu_us_per_event"] is not None:
+        print(f"cpu per event   {report['cpu_us_per_event']:.1f} us")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(benchmark(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+In-process stand-ins for Kafka and the Schema Registry, to benchmark the API alone.
+"""
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+
+class MockMessage:
+    def __init__(self, topic: str, key, value):
+        self._topic = topic
+        self._key = key
+        self._value = value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return 0
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+
+class MockProducer:
+    """
+    Producer with the `confluent_kafka.Producer` methods used by the API.
+
+    Messages are acknowledged on the next `poll()`/`flush()`, after an
+    optional simulated broker latency.
+    """
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.produced = 0
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def produce(self, topic, value=None, key=None, headers=None, callback=None, **kwargs):
+        with self._lock:
+            self.produced += 1
+            self._pending.append((time.monotonic(), callback, MockMessage(topic, key, value)))
+
+    def poll(self, timeout=None):
+        served = 0
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            with self._lock:
+                ready = self._pending and self._pending[0][0] + self.latency_s <= time.monotonic()
+                item = self._pending.popleft() if ready else None
+            if item is not None:
+                _, callback, msg = item
+                if callback is not None:
+                    callback(None, msg)
+                served += 1
+                continue
+            if served or time.monotonic() >= deadline:
+                return served
+            time.sleep(min(0.001, max(0.0, deadline - time.monotonic())))
+
+    def flush(self, timeout=None):
+        deadline = time.monotonic() + (timeout if timeout is not None else 1e9)
+        while len(self) and time.monotonic() < deadline:
+            self.poll(0.001)
+        return len(self)
+
+    def list_topics(self, topic=None, timeout=-1):
+        topics = {} if topic is None else {topic: SimpleNamespace(error=None, partitions={0: None})}
+        return SimpleNamespace(brokers={0: None}, topics=topics)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class MockSchemaRegistryClient:
+    """
+    Schema Registry client that registers schemas in memory.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def register_schema(self, subject_name, schema, normalize_schemas=False):
+        with self._lock:
+            key = (subject_name, schema.schema_str)
+            if key not in self._ids:
+                self._ids[key] = len(self._ids) + 1
+            return self._ids[key]
+
+    def get_subjects(self):
+        return sorted({subject for subject, _ in self._ids})
@@ -0,0 +1,142 @@
+"""
+Realistic Airflow event payloads for the benchmarks.
+"""
+import datetime
+import json
+import random
+from typing import Any, Callable, Dict
+
+STATES = ("queued", "running", "success", "failed", "up_for_retry")
+OPERATORS = ("PythonOperator", "BashOperator", "KubernetesPodOperator", "SparkSubmitOperator")
+
+
+def _timestamps(rng: random.Random):
+    logical_date = datetime.datetime(2025, 5, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(
+        hours=rng.randrange(24 * 30)
+    )
+    start_date = logical_date + datetime.timedelta(seconds=rng.randrange(1, 120))
+    end_date = start_date + datetime.timedelta(seconds=rng.randrange(1, 3600))
+    return logical_date, start_date, end_date
+
+
+def _ids(rng: random.Random):
+    dag_id = f"dag_{rng.randrange(200):03d}"
+    task_id = f"task_{rng.randrange(50):02d}"
+    return dag_id, task_id
+
+
+def dag_run_v2(rng: random.Random) -> Dict[str, Any]:
+    dag_id, _ = _ids(rng)
+    logical_date, start_date, end_date = _timestamps(rng)
+    return {
+        "dag_id": dag_id,
+        "run_id": f"scheduled__{logical_date.isoformat()}",
+        "execution_date": logical_date.isoformat(),
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "data_interval_start": (logical_date - datetime.timedelta(hours=1)).isoformat(),
+        "data_interval_end": logical_date.isoformat(),
+        "last_scheduling_decision": start_date.isoformat(),
+        "queued_at": logical_date.isoformat(),
+        "updated_at": end_date.isoformat(),
+        "state": rng.choice(("running", "success", "failed")),
+        "run_type": "scheduled",
+        "external_trigger": False,
+        "conf": json.dumps({"input_path": "/data/in", "output_path": "/data/out"}),
+        "creating_job_id": rng.randrange(1, 10_000),
+        "dag_hash": f"{rng.getrandbits(64):016x}",
+        "clear_number": 0,
+    }
+
+
+def task_instance_v2(rng: random.Random) -> Dict[str, Any]:
+    dag_id, task_id = _ids(rng)
+    logical_date, start_date, end_date = _timestamps(rng)
+    return {
+        "dag_id": dag_id,
+        "task_id": task_id,
+        "run_id": f"scheduled__{logical_date.isoformat()}",
+        "map_index": -1,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "duration": (end_date - start_date).total_seconds(),
+        "state": rng.choice(STATES),
+        "try_number": rng.randrange(1, 4),
+        "max_tries": 3,
+        "hostname": f"airflow-worker-{rng.randrange(20)}.airflow.svc.cluster.local",
+        "unixname": "airflow",
+        "job_id": rng.randrange(1, 100_000),
+        "pid": rng.randrange(100, 65_000),
+        "operator": rng.choice(OPERATORS),
+        "executor_config": json.dumps({"pod_override": {"spec": {"containers": [{"name": "base"}]}}}),
+        "pool": "default_pool",
+        "pool_slots": 1,
+        "queue": "default",
+        "priority_weight": rng.randrange(1, 10),
+        "queued_by_job_id": rng.randrange(1, 10_000),
+        "queued_dttm": logical_date.isoformat(),
+        "updated_at": end_date.isoformat(),
+        "task_display_name": task_id,
+    }
+
+
+def dag_run_v3(rng: random.Random) -> Dict[str, Any]:
+    dag_id, _ = _ids(rng)
+    logical_date, start_date, end_date = _timestamps(rng)
+    return {
+        "dag_id": dag_id,
+        "run_id": f"scheduled__{logical_date.isoformat()}",
+        "queued_at": logical_date.isoformat(),
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "data_interval_start": (logical_date - datetime.timedelta(hours=1)).isoformat(),
+        "data_interval_end": logical_date.isoformat(),
+        "run_after": logical_date.isoformat(),
+        "last_scheduling_decision": start_date.isoformat(),
+        "updated_at": end_date.isoformat(),
+        "logical_date": logical_date.isoformat(),
+        "state": rng.choice(("running", "success", "failed")),
+        "run_type": "scheduled",
+        "triggered_by": "timetable",
+        "span_status": "ended",
+        "creating_job_id": rng.randrange(1, 10_000),
+        "log_template_id": 1,
+        "clear_number": 0,
+        "conf": json.dumps({"input_path": "/data/in", "output_path": "/data/out"}),
+        "context_carrier": json.dumps({}),
+        "bundle_version": None,
+    }
+
+
+def task_instance_v3(rng: random.Random) -> Dict[str, Any]:
+    dag_id, task_id = _ids(rng)
+    logical_date, start_date, end_date = _timestamps(rng)
+    return {
+        "dag_id": dag_id,
+        "task_id": task_id,
+        "run_id": f"scheduled__{logical_date.isoformat()}",
+        "map_index": -1,
+        "state": rng.choice(STATES),
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "duration": (end_date - start_date).total_seconds(),
+        "try_number": rng.randrange(1, 4),
+        "hostname": f"airflow-worker-{rng.randrange(20)}.airflow.svc.cluster.local",
+        "unixname": "airflow",
+        "job_id": str(rng.randrange(1, 100_000)),
+        "pool": "default_pool",
+        "pool_slots": 1,
+        "queue": "default",
+        "priority_weight": rng.randrange(1, 10),
+        "operator": rng.choice(OPERATORS),
+        "queued_by_job_id": str(rng.randrange(1, 10_000)),
+    }
+
+
+# (airflow version, event type) -> payload factory
+PAYLOADS: Dict[tuple, Callable[[random.Random], Dict[str, Any]]] = {
+    ("v2", "dag_run"): dag_run_v2,
+    ("v2", "task_instance"): task_instance_v2,
+    ("v3", "dag_run"): dag_run_v3,
+    ("v3", "task_instance"): task_instance_v3,
+}
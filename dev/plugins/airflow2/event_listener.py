@@ -1,12 +1,22 @@
 from __future__ import annotations
 
-import requests
+import atexit
 import datetime
-import types
 import enum
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import types
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from typing import TYPE_CHECKING
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Tuple
 
 from airflow.listeners import hookimpl
 from airflow.models.taskinstance import TaskInstance
@@ -21,35 +31,264 @@ API_TASK_INSTANCE_ENDPOINT = f"{API_BASE_ENDPOINT}/api/v1/airflow_v2/events/task
 
 PRIMITIVE_TYPES = (str, int, float, bool, type(None))
 
-def instance_to_dict(instance: DagRun) -> Dict[str, Any]:
-    result_dict = {}
+# Fields of the API models, except the states and the error message set below
+DAG_RUN_FIELDS = (
+    "dag_id", "run_id", "execution_date", "start_date", "end_date",
+    "data_interval_start", "data_interval_end", "last_scheduling_decision",
+    "queued_at", "updated_at", "run_type", "external_trigger", "conf",
+    "creating_job_id", "dag_hash", "clear_number",
+)
+TASK_INSTANCE_FIELDS = (
+    "dag_id", "task_id", "run_id", "map_index", "start_date", "end_date",
+    "duration", "try_number", "max_tries", "hostname", "unixname", "job_id", "pid",
+    "operator", "executor_config", "external_executor_id", "pool", "pool_slots",
+    "queue", "priority_weight", "queued_by_job_id", "queued_dttm", "trigger_id",
+    "trigger_timeout", "next_method", "next_kwargs", "updated_at",
+    "rendered_map_index", "is_trigger_log_event", "task_display_name",
+)
 
-    def process_value(value: Any) -> Any:
-        if isinstance(value, datetime.datetime):
-            return value.isoformat()
-        elif isinstance(value, datetime.date):
-            return value.isoformat()
-        elif isinstance(value, PRIMITIVE_TYPES) or isinstance(value, enum.Enum):
-             if isinstance(value, enum.Enum):
-                 return value.value if hasattr(value, 'value') else str(value)
-             else:
-                return value
-        else:
+SENDER_BATCH_SIZE = int(os.getenv("AIRFLOW_API_LOGGER_BATCH_SIZE", "100"))
+SENDER_FLUSH_INTERVAL_S = float(os.getenv("AIRFLOW_API_LOGGER_FLUSH_INTERVAL_S", "1.0"))
+SENDER_MAX_QUEUE_SIZE = int(os.getenv("AIRFLOW_API_LOGGER_MAX_QUEUE_SIZE", "10000"))
+SENDER_REQUEST_TIMEOUT_S = float(os.getenv("AIRFLOW_API_LOGGER_REQUEST_TIMEOUT_S", "10"))
+SENDER_SHUTDOWN_TIMEOUT_S = float(os.getenv("AIRFLOW_API_LOGGER_SHUTDOWN_TIMEOUT_S", "5"))
+# "gzip" to send batches as gzip-compressed NDJSON, "none" for a JSON list
+SENDER_COMPRESSION = os.getenv("AIRFLOW_API_LOGGER_COMPRESSION", "none").lower()
+SENDER_GZIP_LEVEL = int(os.getenv("AIRFLOW_API_LOGGER_GZIP_LEVEL", "5"))
+
+
+class EventSender:
+    """
+    Buffer events in memory and post them in batches from a background thread.
+
+    Hooks only enqueue, so the task and scheduler latency does not depend on
+    the API latency. Batches are sent when they reach `batch_size` or every
+    `flush_interval` seconds, through a keep-alive session. When the buffer
+    is full new events are dropped instead of blocking Airflow.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = SENDER_BATCH_SIZE,
+        flush_interval: float = SENDER_FLUSH_INTERVAL_S,
+        max_queue_size: int = SENDER_MAX_QUEUE_SIZE,
+        timeout: float = SENDER_REQUEST_TIMEOUT_S,
+        compression: str = SENDER_COMPRESSION,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_started(self):
+        # Airflow forks task processes: threads do not survive a fork, so each
+        # process starts its own sender thread and session.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._stop = threading.Event()
+            self._session = self._build_session()
+            self._thread = threading.Thread(
+                target=self._run, name="airflow-api-logger-sender", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+            # Fallback for processes that exit normally: forked task runners
+            # exit with os._exit and rely on `before_stopping` instead
+            atexit.register(self.close)
+
+    @staticmethod
+    def _build_session() -> requests.Session:
+        session = requests.Session()
+        retries = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+        )
+        session.mount("http://", HTTPAdapter(pool_maxsize=2, max_retries=retries))
+        session.mount("https://", HTTPAdapter(pool_maxsize=2, max_retries=retries))
+        session.headers.update(
+            {
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            }
+        )
+        return session
+
+    def enqueue(self, endpoint: str, payload: dict) -> bool:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((endpoint, payload))
+            return True
+        except queue.Full:
+            print(f"Warning: event buffer is full, dropping event for {endpoint}")
+            return False
+
+    def _encode(self, batch: list) -> tuple[bytes, Dict[str, str]]:
+        if self.compression == "gzip":
+            body = b"".join(
+                json.dumps(payload, separators=(",", ":")).encode() + b"\n"
+                for payload in batch
+            )
+            headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+            return gzip.compress(body, compresslevel=SENDER_GZIP_LEVEL), headers
+        return json.dumps(batch, separators=(",", ":")).encode(), {}
+
+    def _post(self, endpoint: str, batch: list):
+        try:
+            body, headers = self._encode(batch)
+            response = self._session.post(
+                f"{endpoint}/batch", data=body, headers=headers, timeout=self.timeout
+            )
+            if not 200 <= response.status_code < 300:
+                print(
+                    f"Failed to send {len(batch)} events to {endpoint}. "
+                    f"Status code: {response.status_code}, Response: {response.text}"
+                )
+            elif response.json().get("published") != len(batch):
+                print(f"Some events were not published to {endpoint}: {response.text}")
+        except Exception as e:
+            print(f"Error sending {len(batch)} events to {endpoint}: {e}")
+
+    def _run(self):
+        batches: Dict[str, list] = {}
+        deadline = time.monotonic() + self.flush_interval
+        while True:
             try:
-                return str(value)
-            except Exception as e:
-                print(f"Warning: Could not convert value {value} to string: {e}")
-                return None
+                endpoint, payload = self._queue.get(
+                    timeout=max(0.0, deadline - time.monotonic())
+                )
+                batch = batches.setdefault(endpoint, [])
+                batch.append(payload)
+                if len(batch) >= self.batch_size:
+                    self._post(endpoint, batches.pop(endpoint))
+            except queue.Empty:
+                pass
+            stopping = self._stop.is_set()
+            if stopping or time.monotonic() >= deadline:
+                if stopping and not self._queue.empty():
+                    continue
+                for endpoint in list(batches):
+                    self._post(endpoint, batches.pop(endpoint))
+                if stopping:
+                    return
+                deadline = time.monotonic() + self.flush_interval
+
+    def close(self, timeout: float = SENDER_SHUTDOWN_TIMEOUT_S):
+        """
+        Send the buffered events, waiting at most `timeout` seconds.
+
+        An event enqueued afterwards starts a new sender thread.
+        """
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self._pid = None
+
+
+event_sender = EventSender()
+
+
+_MISSING = object()
+
+
+def _keep(value: Any) -> Any:
+    return value
+
+
+def _isoformat(value: Any) -> Any:
+    return value.isoformat()
+
+
+def _enum_value(value: Any) -> Any:
+    return value.value
+
 
-    print("Warning: Input object doesn't look like a standard SQLAlchemy model instance. Falling back to vars().")
+def _to_str(value: Any) -> Any:
     try:
-        for k, v in vars(instance).items():
-            if not k.startswith('_') and not isinstance(v, types.MethodType) and not callable(v):
-                result_dict[k] = process_value(v)
-        return result_dict
+        return str(value)
+    except Exception as e:
+        print(f"Warning: Could not convert value {value} to string: {e}")
+        return None
+
+
+def _skip(value: Any) -> Any:
+    return _MISSING
+
+
+_converters: Dict[type, Callable[[Any], Any]] = {}
+
+
+def converter_for(value: Any) -> Callable[[Any], Any]:
+    """
+    Return how values of the type of `value` are sent, resolved once per type.
+    """
+    value_type = type(value)
+    converter = _converters.get(value_type)
+    if converter is None:
+        if issubclass(value_type, (datetime.datetime, datetime.date)):
+            converter = _isoformat
+        elif issubclass(value_type, enum.Enum):
+            converter = _enum_value
+        elif issubclass(value_type, PRIMITIVE_TYPES):
+            converter = _keep
+        elif callable(value):
+            converter = _skip
+        else:
+            converter = _to_str
+        _converters[value_type] = converter
+    return converter
+
+
+_field_plans: Dict[Tuple[type, Tuple[str, ...]], Tuple[str, ...]] = {}
+
+
+def field_plan(cls: type, fields: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Return the fields read from instances of `cls`, computed once per class.
+
+    Fields that `cls` defines as methods are never instance data and are
+    left out.
+    """
+    plan = _field_plans.get((cls, fields))
+    if plan is None:
+        plan = tuple(
+            name for name in fields if not isinstance(getattr(cls, name, None), types.FunctionType)
+        )
+        _field_plans[(cls, fields)] = plan
+    return plan
+
+
+def instance_to_dict(instance: Any, fields: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    Serialize the `fields` of an instance declared by the API models.
+
+    Values are read from the instance `__dict__`, so attributes and
+    relationships SQLAlchemy has not loaded are skipped instead of queried.
+    """
+    try:
+        values = vars(instance)
     except TypeError:
-         print("Error: Could not process the input object using vars().")
-         return {}
+        print("Error: Could not process the input object using vars().")
+        return {}
+    result_dict = {}
+    for name in field_plan(type(instance), fields):
+        value = values.get(name, _MISSING)
+        if value is _MISSING:
+            continue
+        converter = _converters.get(type(value)) or converter_for(value)
+        value = converter(value)
+        if value is not _MISSING:
+            result_dict[name] = value
+    return result_dict
 
 
 def serialize_runtime_task_instance(
@@ -58,7 +297,7 @@ def serialize_runtime_task_instance(
     new_state: TaskInstanceState,
     error_message: str | None = None,
 ) -> dict:
-    payload = instance_to_dict(task_instance)
+    payload = instance_to_dict(task_instance, TASK_INSTANCE_FIELDS)
     payload["previous_state"] = previous_state
     payload["state"] = new_state
     payload["error_message"] = str(error_message) if error_message is not None else None
@@ -71,7 +310,7 @@ def serialize_task_instance(
     new_state: TaskInstanceState,
     error_message: str | None = None,
 ) -> dict:
-    payload = instance_to_dict(task_instance)
+    payload = instance_to_dict(task_instance, TASK_INSTANCE_FIELDS)
     payload["previous_state"] = previous_state
     payload["state"] = new_state
     payload["error_message"] = str(error_message) if error_message is not None else None
@@ -82,27 +321,12 @@ def send_task_instance_state(
     previous_state: TaskInstanceState,
     new_state: TaskInstanceState,
     error_message: str | None = None,
-) -> int:
-    try:
-        payload = serialize_task_instance(task_instance, previous_state, new_state, error_message)
-        response = requests.post(
-            API_TASK_INSTANCE_ENDPOINT,
-            headers={
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            },
-            json=payload,
-        )
-        if 200 <= response.status_code < 300:
-            return response.status_code
-        else:
-            raise Exception(
-                f"Failed to send task instance state. Status code: {response.status_code}, Response: {response.text}"
-            )
-    except Exception as e:
-        print(f"Payload: {payload}")
-        print(f"Error sending task instance state: {e}")
-        return False
+) -> bool:
+    """
+    Queue the task instance to be sent to the API.
+    """
+    payload = serialize_task_instance(task_instance, previous_state, new_state, error_message)
+    return event_sender.enqueue(API_TASK_INSTANCE_ENDPOINT, payload)
 
 
 def serialize_dag_run(
@@ -110,7 +334,7 @@ def serialize_dag_run(
     new_state: DagRunState,
     error_message: str | None = None,
 ) -> dict:
-    payload = instance_to_dict(dag_run)
+    payload = instance_to_dict(dag_run, DAG_RUN_FIELDS)
     payload["state"] = new_state
     payload["error_message"] = str(error_message) if error_message is not None else None
     return payload
@@ -120,27 +344,12 @@ def send_dag_run_state(
     dag_run: DagRun,
     new_state: DagRunState,
     error_message: str | None = None,
-) -> int:
-    try:
-        payload = serialize_dag_run(dag_run, new_state, error_message)
-        response = requests.post(
-            API_DAG_RUN_ENDPOINT,
-            headers={
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            },
-            json=payload,
-        )
-        if 200 <= response.status_code < 300:
-            return response.status_code
-        else:
-            raise Exception(
-                f"Failed to send task instance state. Status code: {response.status_code}, Response: {response.text}"
-            )
-    except Exception as e:
-        print(f"Payload: {payload}")
-        print(f"Error sending DAG run state: {e}")
-        return False
+) -> bool:
+    """
+    Queue the DAG run to be sent to the API.
+    """
+    payload = serialize_dag_run(dag_run, new_state, error_message)
+    return event_sender.enqueue(API_DAG_RUN_ENDPOINT, payload)
 
 
 @hookimpl
@@ -215,3 +424,13 @@ def on_dag_run_running(dag_run: DagRun, msg: str):
         new_state=DagRunState.RUNNING,
     )
 
+
+@hookimpl
+def before_stopping(component):
+    """
+    Send the buffered events before the Airflow component stops.
+
+    Task runners exit with `os._exit`, which skips atexit handlers, so the
+    terminal task events would otherwise be lost.
+    """
+    event_sender.close()
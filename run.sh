@@ -1,3 +1,3 @@
 #!/bin/bash
 
-fastapi run
+exec python -m app.server